@@ -0,0 +1,162 @@
+import os
+import sys
+import gzip
+import argparse
+from datetime import datetime, timedelta
+from ftplib import error_perm
+from concurrent.futures import ThreadPoolExecutor
+
+# FTPSessionPool and the resumable download_file are those of the AMATERASS downloads (download_AMATERASS)
+AMATERASS_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'download_AMATERASS'))
+if AMATERASS_FOLDER not in sys.path:
+    sys.path.insert(0, AMATERASS_FOLDER)
+
+from amaterass_ftp import FTPSessionPool, download_file, DEFAULT_SESSIONS, DEFAULT_RETRIES, DEFAULT_BACKOFF
+
+# solar_slots of the PT-JPL engine shared by all versions (test/ptjpl_engine)
+ENGINE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'test'))
+if ENGINE_FOLDER not in sys.path:
+    sys.path.insert(0, ENGINE_FOLDER)
+
+from ptjpl_engine.solar_slots import daytime_slot_filter, extent_points
+
+AHILST_HOST = 'modis.cr.chiba-u.ac.jp'
+AHILST_PORT = 21
+AHILST_FOLDER = '/yyamamoto/AHILST/v0/'
+FILE_PREFIX = 'AHILST.v0.'
+FILE_SUFFIX = '.dat.gz'
+GZIP_BLOCK_SIZE = 1024 * 1024
+AHILST_JP_EXTENT = (120.0, 150.0, 20.0, 50.0) # l_lon, r_lon, b_lat, t_lat of the 1500 x 1500 JP frames
+
+
+# UTC time of an AHILST.v0.YYYYmmddHHMM.dat.gz file name, None for other names
+def file_utc_time(filename):
+    if not (filename.startswith(FILE_PREFIX) and filename.endswith(FILE_SUFFIX)):
+        return None
+    try:
+        return datetime.strptime(filename[len(FILE_PREFIX):-len(FILE_SUFFIX)], "%Y%m%d%H%M")
+    except ValueError:
+        return None
+
+
+def month_strs(start_month, end_month):
+    months = []
+    temp_month = datetime(start_month.year, start_month.month, 1)
+    while temp_month <= end_month:
+        months.append(temp_month.strftime("%Y%m"))
+        temp_month = (temp_month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+# slot filter keeping the UTC times in which the sun is up somewhere in an extent (l_lon, r_lon, b_lat, t_lat)
+def daytime_extent_filter(extent=AHILST_JP_EXTENT):
+    return daytime_slot_filter(*extent_points(extent))
+
+
+# {file name: size} of a month folder; MLSD when the server has it, NLST and SIZE otherwise
+def list_month(pool, month_str):
+    ftp_folder = AHILST_FOLDER + month_str
+    ftp = pool.acquire()
+    try:
+        try:
+            month_files = {name: int(facts['size']) for name, facts in ftp.mlsd(ftp_folder, ['type', 'size'])
+                           if facts.get('type') == 'file'}
+        except error_perm:
+            month_files = {}
+            for ftp_path in ftp.nlst(ftp_folder):
+                name = ftp_path.split('/')[-1]
+                if file_utc_time(name) is not None:
+                    month_files[name] = ftp.size(ftp_folder + '/' + name)
+    except error_perm as e:
+        # no such month on the server
+        ftp.voidcmd('TYPE I')
+        pool.release(ftp)
+        print(ftp_folder)
+        print(e)
+        return {}
+    except Exception:
+        pool.discard(ftp)
+        raise
+    # listings switch the session to ASCII, SIZE and RETR of the downloads need binary
+    ftp.voidcmd('TYPE I')
+    pool.release(ftp)
+    return month_files
+
+
+# gzip keeps the CRC-32 and length of the data in its trailer; reading the file to the end checks both
+def verify_gzip(gz_filename):
+    try:
+        with gzip.open(gz_filename, 'rb') as file:
+            while file.read(GZIP_BLOCK_SIZE):
+                pass
+        return True
+    except Exception as e:
+        print(gz_filename)
+        print(e)
+        return False
+
+
+def mirror_AHILST(storage_path, start_month, end_month, slot_filter=None, sessions=DEFAULT_SESSIONS,
+                  retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, check_gzip=True, host=AHILST_HOST, port=AHILST_PORT):
+    """
+        Incremental mirror of the AHILST v0 .dat.gz files of some months into <storage_path>/<YYYYMM>/.
+        A file is fetched when it is missing locally or its size differs from the server's, over `sessions`
+        concurrent FTP sessions (resumed from .part files after broken transfers, see download_AMATERASS/amaterass_ftp.download_file).
+
+        :param slot_filter: function of the UTC time of a file, only files it keeps are mirrored (e.g. daytime_extent_filter)
+        :param check_gzip: check the gzip CRC-32 of every new file, a broken file is removed and counted as failed
+        :return: the files that could not be fetched
+        """
+    pool = FTPSessionPool(host, port, sessions)
+
+    def sync_file(job):
+        month_str, name, remote_size = job
+        local_file = os.path.join(storage_path, month_str, name)
+        if not download_file(pool, AHILST_FOLDER + month_str + '/' + name, local_file, retries, backoff):
+            return False
+        if check_gzip and not verify_gzip(local_file):
+            os.remove(local_file)
+            return False
+        return True
+
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            months_files = list(executor.map(lambda month_str: list_month(pool, month_str), month_strs(start_month, end_month)))
+        jobs = []
+        for month_str, month_files in zip(month_strs(start_month, end_month), months_files):
+            for name, remote_size in sorted(month_files.items()):
+                utc_time = file_utc_time(name)
+                if utc_time is None or (slot_filter is not None and not slot_filter(utc_time)):
+                    continue
+                local_file = os.path.join(storage_path, month_str, name)
+                if os.path.exists(local_file) and os.path.getsize(local_file) == remote_size:
+                    continue
+                if not os.path.exists(os.path.dirname(local_file)):
+                    os.makedirs(os.path.dirname(local_file), exist_ok=True)
+                jobs.append((month_str, name, remote_size))
+        print(str(len(jobs)) + ' files to fetch')
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            done = list(executor.map(sync_file, jobs))
+    finally:
+        pool.close()
+    return [month_str + '/' + name for (month_str, name, _), ok in zip(jobs, done) if not ok]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mirror AHILST v0 .dat.gz files (replaces the wget -r loop)')
+    parser.add_argument('storage_path')
+    parser.add_argument('--start', default='2018-01', help='first month, e.g. 2018-01')
+    parser.add_argument('--end', default='2019-12', help='last month (included)')
+    parser.add_argument('--daytime-extent', type=float, nargs=4, metavar=('L_LON', 'R_LON', 'B_LAT', 'T_LAT'),
+                        help='only files of the slots with daylight somewhere in the extent, e.g. 120 150 20 50 for JP '
+                             '(the night LST also feeds Rlu and Rnet, leave it out for products with night steps)')
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument('--no-gzip-check', action='store_true')
+    args = parser.parse_args()
+
+    slot_filter = daytime_extent_filter(args.daytime_extent) if args.daytime_extent else None
+    failed_files = mirror_AHILST(args.storage_path, datetime.strptime(args.start, "%Y-%m"), datetime.strptime(args.end, "%Y-%m"),
+                                 slot_filter, args.sessions, check_gzip=not args.no_gzip_check)
+    print(str(len(failed_files)) + ' files failed')
+    for failed_file in failed_files:
+        print(failed_file)
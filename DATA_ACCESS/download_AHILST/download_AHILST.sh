@@ -1 +1,6 @@
-wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201801;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201802;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201803;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201804;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201805;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201806;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201807;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201808;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201809;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201810;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201811;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201812;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201901;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201902;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201903;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201904;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201905;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201906;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201907;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201908;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201909;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201910;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201911;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201912;
\ No newline at end of file
+# AHILST v0 .dat.gz files of 2018-2019 into ./YYYYMM/, fetched 4 at a time; a rerun only fetches new or incomplete files.
+# --daytime-extent 120 150 20 50 limits the mirror to the slots with daylight somewhere in the JP extent.
+python ahilst_mirror.py . --start 2018-01 --end 2019-12 --sessions 4
+
+# before: one sequential wget -r per month
+# wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201801;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201802;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201803;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201804;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201805;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201806;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201807;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201808;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201809;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201810;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201811;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201812;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201901;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201902;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201903;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201904;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201905;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201906;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201907;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201908;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201909;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201910;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201911;wget -r ftp://modis.cr.chiba-u.ac.jp/yyamamoto/AHILST/v0/201912;
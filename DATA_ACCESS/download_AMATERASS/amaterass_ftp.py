@@ -0,0 +1,315 @@
+from datetime import datetime, timedelta
+from ftplib import FTP, error_perm
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import threading
+import time
+
+AMATERASS_HOST = 'amaterass.cr.chiba-u.ac.jp'
+AMATERASS_PORT = 21
+ARCHIVE_FOLDER = '/quasi-realtime/himawari829/archived/'
+JP_SUFFIXES = ['.dwn.sw.flx.sfc.msm.1km.bin.bz2', '.rh.sfc.msm.1km.bin.bz2', '.tsfc.msm.1km.bin.bz2'] # SRd, RH, Ta
+FD_SUFFIXES = ['.dwn.sw.flx.sfc.fld.4km.bin.bz2'] # SRd
+
+time_internal = 10  # mins
+DEFAULT_SESSIONS = 4 # FTP connections (and concurrent RETR)
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 2 # seconds, doubled after every failed attempt
+DEFAULT_TIMEOUT = 60 # seconds
+BLOCK_SIZE = 1024 * 1024
+MANIFEST_PREFIX = 'downloaded_times'
+
+
+# UTC file times (YYYYmmddHHMM) of every 10-minute step of a local time period
+def utc_file_times(start_time, end_time, utc_offset):
+    data_start_date = datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%SZ") - timedelta(hours=utc_offset)
+    data_end_date = datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%SZ") - timedelta(hours=utc_offset)
+    file_times = []
+    temp_data = data_start_date
+    while temp_data < data_end_date:
+        file_times.append(temp_data.strftime("%Y%m%d%H%M"))
+        temp_data = temp_data + timedelta(minutes=time_internal)
+    return file_times
+
+
+def remote_path(file_time_str, file_suffix, region='JP'):
+    return ARCHIVE_FOLDER + region + '/' + file_time_str[:6] + '/' + file_time_str[:8] + '/' + file_time_str + file_suffix
+
+
+def local_path(storage_path, file_time_str, file_suffix):
+    return os.path.join(storage_path, file_time_str[:6], file_time_str[:8], file_time_str + file_suffix)
+
+
+# login refused by the server: the run is aborted instead of reporting every file as missing
+class LoginError(Exception):
+    pass
+
+
+class FTPSessionPool:
+    """
+        A fixed number of logged-in FTP sessions shared by the download threads.
+        Sessions are opened on first use; a session that failed is closed and replaced by a new one.
+        """
+    def __init__(self, host=AMATERASS_HOST, port=AMATERASS_PORT, size=DEFAULT_SESSIONS, user='', passwd='',
+                 timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.timeout = timeout
+        self.sessions = queue.Queue()
+        for _ in range(size):
+            self.sessions.put(None)
+
+    def connect(self):
+        ftp = FTP(timeout=self.timeout)
+        try:
+            ftp.connect(self.host, self.port)
+            ftp.login(self.user, self.passwd)
+            ftp.voidcmd('TYPE I') # binary, also needed for SIZE
+        except Exception:
+            ftp.close()
+            raise
+        return ftp
+
+    def acquire(self):
+        ftp = self.sessions.get()
+        if ftp is None:
+            try:
+                ftp = self.connect()
+            except Exception:
+                self.sessions.put(None)
+                raise
+        return ftp
+
+    # a session for one attempt at a file: a refused login (error_perm, e.g. 530) is raised as LoginError, it fails
+    # for every file; None after a connection error, which is printed and retried like a broken transfer
+    def session(self):
+        try:
+            return self.acquire()
+        except error_perm as e:
+            raise LoginError(self.host + ': ' + str(e))
+        except Exception as e:
+            print(self.host)
+            print(e)
+            return None
+
+    def release(self, ftp):
+        self.sessions.put(ftp)
+
+    # drop a session in an unknown state, the next acquire reconnects
+    def discard(self, ftp):
+        try:
+            ftp.close()
+        except Exception:
+            pass
+        self.sessions.put(None)
+
+    def close(self):
+        while not self.sessions.empty():
+            ftp = self.sessions.get()
+            if ftp is not None:
+                try:
+                    ftp.quit()
+                except Exception:
+                    ftp.close()
+
+
+# one file into <local_file>.part, resumed with REST after a broken transfer and renamed once its size matches SIZE;
+# returns False for files missing on the server (550) and after the last failed retry (also of the connection),
+# raises LoginError when the server refuses the login
+def download_file(pool, ftp_path, local_file, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    part_file = local_file + '.part'
+    for attempt in range(retries + 1):
+        ftp = pool.session()
+        if ftp is None:
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+            continue
+        try:
+            remote_size = ftp.size(ftp_path)
+            offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            if offset > remote_size:
+                offset = 0
+            if offset < remote_size or remote_size == 0:
+                with open(part_file, 'ab' if offset else 'wb') as f:
+                    ftp.retrbinary('RETR ' + ftp_path, f.write, BLOCK_SIZE, rest=offset if offset else None)
+            local_size = os.path.getsize(part_file)
+            if local_size != remote_size:
+                raise IOError('size ' + str(local_size) + ' != SIZE ' + str(remote_size))
+            os.replace(part_file, local_file)
+            pool.release(ftp)
+            return True
+        except error_perm as e:
+            # permanent reply (e.g. 550 no such file): the session is fine, retrying does not help
+            pool.release(ftp)
+            print(ftp_path)
+            print(e)
+            return False
+        except Exception as e:
+            pool.discard(ftp)
+            print(ftp_path)
+            print(e)
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    return False
+
+
+# manifest of the times whose files of a region and set of suffixes are all there, e.g.
+# downloaded_times_JP_dwn-rh-tsfc.txt: runs of other regions or products in the same folder have their own
+def manifest_filename(region, file_suffixes):
+    products = '-'.join(file_suffix.split('.')[1] for file_suffix in file_suffixes)
+    return MANIFEST_PREFIX + '_' + region + '_' + products + '.txt'
+
+
+def read_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return set()
+    with open(manifest_file) as f:
+        return set(line.strip() for line in f if line.strip())
+
+
+# raised from the transfer callback once the decoder has all it needs (decoder.rest_not_needed)
+class TransferDone(Exception):
+    pass
+
+
+# one file decoded while it comes in: every chunk of the transfer goes to decoder.feed, nothing is written to disk.
+# A broken transfer resumes with REST at the compressed bytes fed so far (the decompressor keeps its state);
+# a chunk that does not decode restarts the file with a new decoder from new_decoder().
+# A decoder of the first rows only (AMATERASSDecoder.rest_not_needed) ends the transfer after its last row:
+# the session is closed in the middle of the RETR and the rest of the file is never sent.
+# Returns the decoder once its size matches SIZE (or it has its rows), None for files missing on the server
+# and after the last retry; raises LoginError when the server refuses the login
+def stream_file(pool, ftp_path, new_decoder, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    decoder = new_decoder()
+    decode_errors = []
+
+    def feed(chunk):
+        try:
+            decoder.feed(chunk)
+        except Exception as e:
+            decode_errors.append(e)
+            raise
+        if getattr(decoder, 'rest_not_needed', False):
+            raise TransferDone()
+
+    for attempt in range(retries + 1):
+        ftp = pool.session()
+        if ftp is None:
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+            continue
+        try:
+            remote_size = ftp.size(ftp_path)
+            if decoder.compressed_bytes > remote_size:
+                decoder = new_decoder()
+            if decoder.compressed_bytes < remote_size or remote_size == 0:
+                offset = decoder.compressed_bytes
+                ftp.retrbinary('RETR ' + ftp_path, feed, BLOCK_SIZE, rest=offset if offset else None)
+            if decoder.compressed_bytes != remote_size:
+                raise IOError('size ' + str(decoder.compressed_bytes) + ' != SIZE ' + str(remote_size))
+            pool.release(ftp)
+            return decoder
+        except TransferDone:
+            # the session stopped in the middle of a transfer, the next acquire reconnects
+            pool.discard(ftp)
+            return decoder
+        except error_perm as e:
+            pool.release(ftp)
+            print(ftp_path)
+            print(e)
+            return None
+        except Exception as e:
+            pool.discard(ftp)
+            print(ftp_path)
+            print(e)
+            if decode_errors:
+                del decode_errors[:]
+                decoder = new_decoder()
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    return None
+
+
+# fetch_time(pool, file_time_str) -> True when all files of the time are there, for every file time not yet
+# in the manifest, over `sessions` concurrent FTP sessions. Completed times are appended to the manifest
+# and skipped by later runs; returns the file times with a missing file. A refused login (LoginError) ends the run
+def run_file_times(file_times, fetch_time, manifest_file, sessions=DEFAULT_SESSIONS, host=AMATERASS_HOST,
+                   port=AMATERASS_PORT):
+    done_times = read_manifest(manifest_file)
+    manifest_lock = threading.Lock()
+    pool = FTPSessionPool(host, port, sessions)
+
+    def run_time(file_time_str):
+        complete = fetch_time(pool, file_time_str)
+        if complete:
+            with manifest_lock:
+                with open(manifest_file, 'a') as f:
+                    f.write(file_time_str + '\n')
+        return complete
+
+    todo_times = [file_time_str for file_time_str in file_times if file_time_str not in done_times]
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            completes = list(executor.map(run_time, todo_times))
+    finally:
+        pool.close()
+    return [file_time_str for file_time_str, complete in zip(todo_times, completes) if not complete]
+
+
+# all files of the file times, fetched over `sessions` concurrent FTP sessions.
+# File times whose files are all there are appended to the manifest (<storage_path>/manifest_filename)
+# and skipped by later runs; returns the file times with a missing file
+def download_AMATERASS_times(file_times, storage_path, file_suffixes=JP_SUFFIXES, region='JP', sessions=DEFAULT_SESSIONS,
+                             retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, host=AMATERASS_HOST, port=AMATERASS_PORT,
+                             manifest_file=None):
+    if manifest_file is None:
+        manifest_file = os.path.join(storage_path, manifest_filename(region, file_suffixes))
+
+    def download_time(pool, file_time_str):
+        complete = True
+        for file_suffix in file_suffixes:
+            local_file = local_path(storage_path, file_time_str, file_suffix)
+            if os.path.exists(local_file):
+                continue
+            if not os.path.exists(os.path.dirname(local_file)):
+                os.makedirs(os.path.dirname(local_file), exist_ok=True)
+            if not download_file(pool, remote_path(file_time_str, file_suffix, region), local_file, retries, backoff):
+                complete = False
+        return complete
+
+    return run_file_times(file_times, download_time, manifest_file, sessions, host, port)
+
+
+# all files of the file times decoded on the fly into a sink (amaterass_stream.py: GridStoreSink, SitePixelSink)
+# instead of being kept as .bz2 files; the manifest defaults to <sink.folder>/manifest_filename
+def stream_AMATERASS_times(file_times, sink, file_suffixes=JP_SUFFIXES, region='JP', sessions=DEFAULT_SESSIONS,
+                           retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, host=AMATERASS_HOST, port=AMATERASS_PORT,
+                           manifest_file=None):
+    if manifest_file is None:
+        manifest_file = os.path.join(sink.folder, manifest_filename(region, file_suffixes))
+
+    def stream_time(pool, file_time_str):
+        complete = True
+        for file_suffix in file_suffixes:
+            if sink.has_file(file_time_str, file_suffix):
+                continue
+            decoder = stream_file(pool, remote_path(file_time_str, file_suffix, region),
+                                  lambda: sink.new_decoder(file_suffix), retries, backoff)
+            if decoder is None:
+                complete = False
+                continue
+            try:
+                sink.write(file_time_str, file_suffix, decoder)
+            except Exception as e:
+                print(remote_path(file_time_str, file_suffix, region))
+                print(e)
+                complete = False
+        return complete
+
+    try:
+        return run_file_times(file_times, stream_time, manifest_file, sessions, host, port)
+    finally:
+        sink.close()
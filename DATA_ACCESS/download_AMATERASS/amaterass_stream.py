@@ -0,0 +1,140 @@
+from datetime import datetime
+import os
+import sys
+import threading
+
+import numpy
+
+# the decoder and the grid store are the modules of the area input processing (50_area_data_processing)
+AREA_PROCESSING_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'test',
+                                                      '002_PTJPL_AHILST_MODIS_ERA5_v002', '50_area_data_processing'))
+if AREA_PROCESSING_FOLDER not in sys.path:
+    sys.path.insert(0, AREA_PROCESSING_FOLDER)
+
+from amaterass_reader import AMATERASSDecoder
+from grid_store import PRODUCTS, DayStackWriter, product_of_suffix, read_frame
+
+# first pixel centre (lat, lon) and pixel size of the JP grid, as in 00_save_area_inputdata
+AMATERASS_JP_GRID = (47.6 + 0.01/2, 120. - 0.01/2, 0.01)
+
+
+# nearest (row, col) pixels of points on a north-up grid given as (first pixel centre lat, lon, pixel size)
+def site_pixel_indices(lats, lons, grid=AMATERASS_JP_GRID):
+    first_lat, first_lon, pixel_size = grid
+    rows = numpy.round((first_lat - numpy.asarray(lats, dtype=float)) / pixel_size).astype(int)
+    cols = numpy.round((numpy.asarray(lons, dtype=float) - first_lon) / pixel_size).astype(int)
+    return rows, cols
+
+
+def file_utc_time(file_time_str):
+    return datetime.strptime(file_time_str, "%Y%m%d%H%M")
+
+
+# Sinks take the decoded files of stream_AMATERASS_times (amaterass_ftp.py):
+#   new_decoder(file_suffix)                     decoder the transfer is fed into
+#   write(file_time_str, file_suffix, decoder)   keeps the decoded grid (called from the download threads)
+#   has_file(file_time_str, file_suffix)         already kept, not fetched again
+#   close()
+class GridStoreSink:
+    """
+        Decoded frames written straight into the per-day stacks of grid_store.py, without .bz2 files on disk.
+
+        :param folder: store folder (the folder of grid_store.convert_day)
+        """
+    def __init__(self, folder):
+        self.folder = folder
+        self.writers = {}
+        self.lock = threading.Lock()
+
+    def new_decoder(self, file_suffix):
+        return AMATERASSDecoder(PRODUCTS[product_of_suffix(file_suffix)][0])
+
+    def writer(self, product, utc_time):
+        key = (product, utc_time.strftime("%Y%m%d"))
+        with self.lock:
+            if key not in self.writers:
+                self.writers[key] = DayStackWriter(self.folder, product, utc_time)
+            return self.writers[key]
+
+    def has_file(self, file_time_str, file_suffix):
+        return read_frame(self.folder, product_of_suffix(file_suffix), file_utc_time(file_time_str)) is not None
+
+    def write(self, file_time_str, file_suffix, decoder):
+        utc_time = file_utc_time(file_time_str)
+        self.writer(product_of_suffix(file_suffix), utc_time).write(utc_time, decoder.rows())
+
+    def close(self):
+        with self.lock:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers = {}
+
+
+class SitePixelSink:
+    """
+        Only the site pixels of every file: the transfer is decompressed down to the row of the southernmost site
+        and dropped there (the rest of the compressed file is not fetched), and each file time is appended to <folder>/<product>_sites.csv as soon as it is decoded
+        ('YYYYmmddHHMM,<site values>' lines, in the order the files come in), so site series build during the download.
+        The csv files of earlier runs in the folder are read back first: their file times are not fetched again.
+
+        :param rows, cols: pixel indices of the sites (site_pixel_indices)
+        """
+    def __init__(self, folder, rows, cols, site_names=None):
+        self.folder = folder
+        self.rows = numpy.asarray(rows)
+        self.cols = numpy.asarray(cols)
+        self.site_names = site_names
+        self.values = {} # {product: {file_time_str: (sites,) float32}}
+        self.lock = threading.Lock()
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for product in PRODUCTS:
+            if os.path.exists(self.csv_filename(product)):
+                self.values[product] = self.read_csv(product)
+
+    def csv_filename(self, product):
+        return os.path.join(self.folder, product + '_sites.csv')
+
+    # {file_time_str: (sites,) float32} of the lines of <product>_sites.csv
+    def read_csv(self, product):
+        csv_filename = self.csv_filename(product)
+        product_values = {}
+        with open(csv_filename) as f:
+            for line in f:
+                fields = line.strip().split(',')
+                if fields[0] in ['', 'Time']:
+                    continue
+                if len(fields) != len(self.rows) + 1:
+                    raise ValueError(csv_filename + ' has ' + str(len(fields) - 1) + ' sites, not ' + str(len(self.rows)))
+                product_values[fields[0]] = numpy.array(fields[1:], dtype='f4')
+        return product_values
+
+    def new_decoder(self, file_suffix):
+        shape = PRODUCTS[product_of_suffix(file_suffix)][0]
+        return AMATERASSDecoder(shape, int(self.rows.min()), int(self.rows.max()) + 1)
+
+    def has_file(self, file_time_str, file_suffix):
+        return file_time_str in self.values.get(product_of_suffix(file_suffix), {})
+
+    def write(self, file_time_str, file_suffix, decoder):
+        product = product_of_suffix(file_suffix)
+        site_values = decoder.rows()[self.rows - int(self.rows.min()), self.cols]
+        with self.lock:
+            self.values.setdefault(product, {})[file_time_str] = site_values
+            csv_filename = self.csv_filename(product)
+            with open(csv_filename, 'a') as f:
+                if self.site_names is not None and os.path.getsize(csv_filename) == 0:
+                    f.write(','.join(['Time'] + list(self.site_names)) + '\n')
+                f.write(','.join([file_time_str] + [str(v) for v in site_values]) + '\n')
+
+    # (time, site) values of a product at the file times, NaN where a file was not decoded (in this or an earlier run)
+    def series(self, file_suffix, file_times):
+        product_values = self.values.get(product_of_suffix(file_suffix), {})
+        series = numpy.full((len(file_times), len(self.rows)), numpy.nan, dtype='f4')
+        for i, file_time_str in enumerate(file_times):
+            if file_time_str in product_values:
+                series[i] = product_values[file_time_str]
+        return series
+
+    def close(self):
+        pass
@@ -1,58 +1,58 @@
-from datetime import datetime, timedelta
-from ftplib import FTP
 import os
-# import subprocess
+import sys
+from datetime import datetime
 
-START_TIME = '2018-07-19T00:00:00Z' # local time
-END_TIME = '2018-07-19T23:59:59Z'
+import numpy
 
-UTC_OFFSET = 9 # hour
-time_internal = 10  # mins
+from amaterass_ftp import utc_file_times, download_AMATERASS_times, stream_AMATERASS_times, JP_SUFFIXES
+from amaterass_stream import GridStoreSink
 
-storage_path = os.getcwd()
+# solar_slots of the PT-JPL engine shared by all versions (test/ptjpl_engine)
+ENGINE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'test'))
+if ENGINE_FOLDER not in sys.path:
+    sys.path.insert(0, ENGINE_FOLDER)
 
+from ptjpl_engine.solar_slots import grid_daytime_mask
 
-def download_AMATERASS_data(file_time):
+START_TIME = '2018-07-19T00:00:00Z' # local time
+END_TIME = '2018-07-19T23:59:59Z'
 
-    file_suffixes = ['.dwn.sw.flx.sfc.msm.1km.bin.bz2', '.rh.sfc.msm.1km.bin.bz2', '.tsfc.msm.1km.bin.bz2'] # SRd, RH, Ta
-    
-    for file_suffix in file_suffixes:
-        file_time_str = file_time
-        file_name = file_time_str + file_suffix
-        ftp_path= '/quasi-realtime/himawari829/archived/JP/'+ file_time_str[:6] + '/' + file_time_str[:8] + '/' + file_name
-        remote_url = 'ftp://amaterass.cr.chiba-u.ac.jp' + ftp_path
+UTC_OFFSET = 9 # hour
 
-        storage_folder = os.path.join(storage_path, file_time_str[:6], file_time_str[:8])
-        if not os.path.exists(storage_folder):
-            os.makedirs(storage_folder)
+storage_path = os.getcwd()
+sessions = 4 # concurrent FTP sessions
+store_path = None # grid store folder (grid_store.py): decode the files while they download instead of keeping the .bz2
+# only SRd (for Rnet) at the times in which the sun is up nowhere on the JP grid, as 00_save_area_inputdata DAYTIME_ONLY
+daytime_only = False
+# JP grid of 00_save_area_inputdata and ptjpl_area_scheduler
+JP_LATS = numpy.arange(47.5-0.01/2, 22.5, -0.01)
+JP_LONS = numpy.arange(120.+0.01/2, 150, 0.01)
 
-        local_file = storage_folder + '/' + file_name
 
-        if not os.path.exists(local_file):
-            try:
-                with open(local_file, 'wb') as f:
-                    ftp.retrbinary('RETR ' + ftp_path, f.write, 1024 * 1024)
-                # p = subprocess.Popen('lbzip2 -d {}'.format(local_file), shell=True)
-                # p.communicate()
-            except Exception as e:
-                print(remote_url)
-                print(e)
-                os.remove(local_file)
+# file times split into the ones with daylight somewhere on the JP grid and the night ones
+def split_daytime_file_times(file_times):
+    utc_times = numpy.array([datetime.strptime(file_time_str, "%Y%m%d%H%M") for file_time_str in file_times],
+                            dtype='datetime64[s]')
+    slot_mask = grid_daytime_mask(utc_times, JP_LATS, JP_LONS)
+    return ([file_time_str for file_time_str, day in zip(file_times, slot_mask) if day],
+            [file_time_str for file_time_str, day in zip(file_times, slot_mask) if not day])
 
 
 if __name__ == "__main__":
 
-    ftp = FTP()
-    ftp.connect('amaterass.cr.chiba-u.ac.jp', 21)
-    ftp.login()
-
-    data_start_date = datetime.strptime(START_TIME, "%Y-%m-%dT%H:%M:%SZ") - timedelta(hours=UTC_OFFSET)
-    data_end_date = datetime.strptime(END_TIME, "%Y-%m-%dT%H:%M:%SZ") - timedelta(hours=UTC_OFFSET)
-
-    temp_data = data_start_date
-    while temp_data < data_end_date:
-        current_time_str = temp_data.strftime("%Y%m%d%H%M")
-        download_AMATERASS_data(current_time_str)
-        temp_data = temp_data + timedelta(minutes=time_internal)
-
-    ftp.close()
\ No newline at end of file
+    # files of finished time steps are listed in downloaded_times_JP_dwn-rh-tsfc.txt, a rerun only fetches the rest
+    # (and resumes broken transfers from their .part files); night times with SRd only are listed in
+    # downloaded_times_JP_dwn.txt, so a full run still fetches their RH/Ta
+    file_times = utc_file_times(START_TIME, END_TIME, UTC_OFFSET)
+    runs = [(file_times, JP_SUFFIXES)]
+    if daytime_only:
+        day_times, night_times = split_daytime_file_times(file_times)
+        runs = [(day_times, JP_SUFFIXES), (night_times, JP_SUFFIXES[:1])]
+    failed_times = []
+    for run_times, run_suffixes in runs:
+        if store_path:
+            failed_times += stream_AMATERASS_times(run_times, GridStoreSink(store_path), run_suffixes, 'JP',
+                                                   sessions=sessions)
+        else:
+            failed_times += download_AMATERASS_times(run_times, storage_path, run_suffixes, 'JP', sessions=sessions)
+    print(str(len(failed_times)) + ' of ' + str(len(file_times)) + ' time steps with missing files')
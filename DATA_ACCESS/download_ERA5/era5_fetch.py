@@ -0,0 +1,179 @@
+import os
+import time
+import calendar
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ERA5_DATASET = 'reanalysis-era5-land'
+# folder name (<data_root>/ERA5_<name>) : ERA5-Land variable
+ERA5_VARIABLES = {
+    'Ta': '2m_temperature',
+    'Td': '2m_dewpoint_temperature',
+    'Rld': 'surface_thermal_radiation_downwards',
+    'Rsd': 'surface_solar_radiation_downwards',
+    'Albedo': 'forecast_albedo',
+    'TotalET': 'total_evaporation',
+}
+FD180_AREA = [60, 85, -60, 180] # N, W, S, E
+JP_AREA = [50, 120, 20, 150]
+HOURS = ['%02d:00' % hour for hour in range(24)]
+
+DEFAULT_MAX_REQUESTS = 4 # requests queued at the CDS at once (the CDS limits the active requests of a user)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 60 # seconds, doubled after every failed attempt
+
+
+# (year, month) of every month from the month of date_start to the month of date_end
+def month_range(date_start, date_end):
+    months = []
+    year, month = date_start.year, date_start.month
+    while (year, month) <= (date_end.year, date_end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+# hourly request of one variable over all days of a month
+def month_request(variable, year, month, area=FD180_AREA):
+    return {
+        'variable': [variable],
+        'year': str(year),
+        'month': '%02d' % month,
+        'day': ['%02d' % day for day in range(1, calendar.monthrange(year, month)[1] + 1)],
+        'time': HOURS,
+        'area': list(area),
+        'format': 'grib',
+    }
+
+
+def month_filename(data_root, name, year, month):
+    return os.path.join(data_root, 'ERA5_' + name, '%d_%02d.grib' % (year, month))
+
+
+# a GRIB file that starts with 'GRIB' and ends with the '7777' end section (so not cut off)
+def valid_grib(grib_filename):
+    if not os.path.exists(grib_filename) or os.path.getsize(grib_filename) < 8:
+        return False
+    with open(grib_filename, 'rb') as file:
+        head = file.read(4)
+        file.seek(-4, os.SEEK_END)
+        tail = file.read(4)
+    return head == b'GRIB' and tail == b'7777'
+
+
+class StubClient:
+    """
+        Offline stand-in for cdsapi.Client: retrieve() waits `delay` seconds (the queue wait) and writes a small
+        GRIB-like file. The first `failures` calls for a target raise, and the calls and the highest number
+        of retrieves running at once are recorded.
+        """
+    def __init__(self, delay=0., failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def retrieve(self, dataset, request, target):
+        with self.lock:
+            self.calls.append((dataset, request, target))
+            attempt = sum(1 for call in self.calls if call[1] == request)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            if attempt <= self.failures:
+                raise RuntimeError('stub failure ' + str(attempt) + ' of ' + target)
+            with open(target, 'wb') as file:
+                file.write(b'GRIB' + repr(sorted(request.items())).encode() + b'7777')
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class ERA5FetchManager:
+    """
+        Monthly ERA5-Land requests of several variables submitted side by side, at most max_requests at once,
+        so the CDS queue waits overlap. Months with a valid file on disk are skipped; a request is downloaded
+        to <file>.part and renamed once it is a valid GRIB, failed requests are retried with backoff.
+
+        :param client_factory: makes the client of each worker thread (cdsapi.Client, or StubClient offline)
+        """
+    def __init__(self, client_factory=None, max_requests=DEFAULT_MAX_REQUESTS, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF):
+        if client_factory is None:
+            import cdsapi
+            client_factory = cdsapi.Client
+        self.client_factory = client_factory
+        self.max_requests = max_requests
+        self.retries = retries
+        self.backoff = backoff
+        self.local = threading.local()
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.client_factory()
+        return self.local.client
+
+    def retrieve_month(self, variable, year, month, area, grib_filename):
+        part_filename = grib_filename + '.part'
+        for attempt in range(self.retries + 1):
+            try:
+                self.client().retrieve(ERA5_DATASET, month_request(variable, year, month, area), part_filename)
+                if not valid_grib(part_filename):
+                    raise IOError('not a complete GRIB file')
+                os.replace(part_filename, grib_filename)
+                print(grib_filename)
+                return True
+            except Exception as e:
+                print(grib_filename)
+                print(e)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        return False
+
+    # names: keys of ERA5_VARIABLES; returns the month files that could not be fetched
+    def fetch(self, names, data_root, date_start, date_end, area=FD180_AREA):
+        jobs = []
+        for year, month in month_range(date_start, date_end):
+            for name in names:
+                grib_filename = month_filename(data_root, name, year, month)
+                if valid_grib(grib_filename):
+                    print('file exist: ', grib_filename)
+                    continue
+                if not os.path.exists(os.path.dirname(grib_filename)):
+                    os.makedirs(os.path.dirname(grib_filename), exist_ok=True)
+                jobs.append((ERA5_VARIABLES[name], year, month, grib_filename))
+
+        def run_job(job):
+            variable, year, month, grib_filename = job
+            return self.retrieve_month(variable, year, month, area, grib_filename)
+
+        with ThreadPoolExecutor(max_workers=self.max_requests) as executor:
+            done = list(executor.map(run_job, jobs))
+        return [job[3] for job, ok in zip(jobs, done) if not ok]
+
+
+def fetch_ERA5(names, data_root, date_start, date_end, area=FD180_AREA, max_requests=DEFAULT_MAX_REQUESTS,
+               client_factory=None):
+    return ERA5FetchManager(client_factory, max_requests).fetch(names, data_root, date_start, date_end, area)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download monthly ERA5-Land GRIB files of several variables at once')
+    parser.add_argument('names', nargs='+', choices=sorted(ERA5_VARIABLES))
+    parser.add_argument('data_root', help='folder holding the ERA5_<name> folders')
+    parser.add_argument('--start', required=True, help='first month, e.g. 2018-01')
+    parser.add_argument('--end', required=True, help='last month (included)')
+    parser.add_argument('--jp', action='store_true', help='JP area instead of the full disk (FD180) area')
+    parser.add_argument('--max-requests', type=int, default=DEFAULT_MAX_REQUESTS)
+    args = parser.parse_args()
+
+    failed = fetch_ERA5(args.names, args.data_root, datetime.strptime(args.start, "%Y-%m"),
+                        datetime.strptime(args.end, "%Y-%m"), JP_AREA if args.jp else FD180_AREA, args.max_requests)
+    print(str(len(failed)) + ' month files failed')
+    for grib_filename in failed:
+        print(grib_filename)
@@ -0,0 +1,103 @@
+import os
+import bz2
+
+import numpy
+
+AMATERASS_JP_SHAPE = (2521, 3001) # 0.01°, .msm.1km.bin.bz2
+AMATERASS_FD_SHAPE = (3000, 3000) # 0.04°, .fld.4km.bin.bz2
+AMATERASS_DTYPE = '>f4'
+CHUNK_SIZE = 256 * 1024 # bytes of compressed data read at once
+
+
+class AMATERASSDecoder:
+    """
+        Incremental decoder of an AMATERASS .bin.bz2 grid: compressed chunks (from a file or an FTP transfer)
+        are fed in as they come and decompressed straight into the big-endian rows [row_start, row_stop).
+        Decompression stops after the last requested row; later chunks are only counted.
+        """
+    def __init__(self, shape=AMATERASS_JP_SHAPE, row_start=0, row_stop=None):
+        if row_stop is None:
+            row_stop = shape[0]
+        self.shape = shape
+        row_bytes = shape[1] * numpy.dtype(AMATERASS_DTYPE).itemsize
+        self.start_byte = row_start * row_bytes
+        self.stop_byte = row_stop * row_bytes
+        self.grid_bytes = shape[0] * row_bytes
+        self.rows_data = numpy.empty((row_stop - row_start, shape[1]), dtype=AMATERASS_DTYPE)
+        self.rows_bytes = memoryview(self.rows_data).cast('B')
+        self.position = 0 # decompressed bytes so far
+        self.compressed_bytes = 0 # compressed bytes fed so far
+        self.decompressor = bz2.BZ2Decompressor()
+
+    @property
+    def done(self):
+        return self.position >= self.stop_byte
+
+    # the requested rows end above the last one of the grid and are all decoded: the rest of the file is not needed
+    @property
+    def rest_not_needed(self):
+        return self.done and self.stop_byte < self.grid_bytes
+
+    def feed(self, chunk):
+        self.compressed_bytes += len(chunk)
+        while not self.done:
+            if self.decompressor.eof:
+                # multi-stream files (lbzip2, pbzip2): continue with the next stream
+                chunk = self.decompressor.unused_data + chunk
+                self.decompressor = bz2.BZ2Decompressor()
+            if not chunk and self.decompressor.needs_input:
+                break
+            data = self.decompressor.decompress(chunk, max_length=self.stop_byte - self.position)
+            chunk = b''
+            copy_start = max(self.start_byte, self.position)
+            copy_stop = min(self.stop_byte, self.position + len(data))
+            if copy_start < copy_stop:
+                self.rows_bytes[copy_start - self.start_byte:copy_stop - self.start_byte] = \
+                    memoryview(data)[copy_start - self.position:copy_stop - self.position]
+            self.position += len(data)
+
+    # the decoded rows as a native float32 array (once all of them came in)
+    def rows(self):
+        if not self.done:
+            raise ValueError('truncated file: ' + str(self.position) + ' of ' + str(self.stop_byte) + ' bytes')
+        # big-endian -> native, in place (once)
+        if self.rows_data.dtype != numpy.dtype('f4'):
+            self.rows_data.byteswap(inplace=True)
+            self.rows_data = self.rows_data.view(self.rows_data.dtype.newbyteorder())
+        return self.rows_data
+
+
+# rows [row_start, row_stop) of an AMATERASS .bin.bz2 grid as a native float32 array.
+# The bz2 payload is decompressed in chunks straight into the result and reading stops
+# after the last requested row, so the rows below are never decompressed.
+def read_AMATERASS_rows(bz2_filename, row_start=0, row_stop=None, shape=AMATERASS_JP_SHAPE):
+    decoder = AMATERASSDecoder(shape, row_start, row_stop)
+    with open(bz2_filename, 'rb') as file:
+        while not decoder.done:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            decoder.feed(chunk)
+    return decoder.rows()
+
+
+# window [row_slice, col_slice] of an AMATERASS grid (NaN when the file is missing or broken)
+def read_AMATERASS_window(bz2_filename, row_slice, col_slice=slice(None), shape=AMATERASS_JP_SHAPE):
+    row_start, row_stop, _ = row_slice.indices(shape[0])
+    if os.path.exists(bz2_filename):
+        try:
+            return read_AMATERASS_rows(bz2_filename, row_start, row_stop, shape)[:, col_slice]
+        except Exception as e:
+            print(bz2_filename)
+            print(e)
+    nan_array = numpy.full((row_stop - row_start, shape[1]), numpy.nan, dtype='f4')
+    return nan_array[:, col_slice]
+
+
+# values of single pixels (e.g. sites) of an AMATERASS grid, decompressing only down to the last of them
+def read_AMATERASS_pixels(bz2_filename, row_indices, col_indices, shape=AMATERASS_JP_SHAPE):
+    row_indices = numpy.asarray(row_indices)
+    col_indices = numpy.asarray(col_indices)
+    row_start = int(row_indices.min())
+    rows_data = read_AMATERASS_window(bz2_filename, slice(row_start, int(row_indices.max()) + 1), shape=shape)
+    return rows_data[row_indices - row_start, col_indices]
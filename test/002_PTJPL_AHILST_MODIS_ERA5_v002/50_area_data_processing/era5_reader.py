@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+import xarray
+
+from regridder import get_regridder
+
+DEFAULT_CACHE_BYTES = 4 * 1024**3 # decoded months kept in memory
+
+
+class ERA5MonthCache:
+    """
+        Decoded monthly ERA5 GRIB files, least recently used first out once max_bytes is exceeded.
+        Each month is loaded with cfgrib once and then served as (day, hour) slices
+        regridded onto the target grid (regridder.get_regridder, same values as xarray .interp).
+        """
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.months = OrderedDict()
+        self.n_decoded = 0
+
+    def cached_bytes(self):
+        return sum(month['values'].nbytes for month in self.months.values())
+
+    # (time, step, latitude, longitude) values and coordinates of the first variable of a monthly GRIB
+    def month(self, era5_grib):
+        if era5_grib in self.months:
+            self.months.move_to_end(era5_grib)
+            return self.months[era5_grib]
+
+        era5_ds = xarray.load_dataset(era5_grib, engine="cfgrib")
+        era5_var = era5_ds[list(era5_ds.data_vars)[0]].transpose('time', 'step', 'latitude', 'longitude')
+        month = {
+            'values': era5_var.values,
+            'latitude': era5_ds.latitude.values,
+            'longitude': era5_ds.longitude.values,
+        }
+        self.n_decoded += 1
+        self.months[era5_grib] = month
+        while len(self.months) > 1 and self.cached_bytes() > self.max_bytes:
+            self.months.popitem(last=False)
+        return month
+
+    # slice of a UTC day and hour, as picked by isel(time=int(area_day), step=int(area_hour)-1),
+    # in dtype when given (the linear weights make it float64)
+    def read_slice(self, era5_grib, area_day, area_hour, lats, lons, method="linear", dtype=None):
+        month = self.month(era5_grib)
+        time_idx = int(area_day)
+        step_idx = int(area_hour)-1
+        era5_regridder = get_regridder(month['latitude'], month['longitude'], lats, lons, method)
+        data_v = era5_regridder(month['values'][time_idx, step_idx])
+        if dtype is not None:
+            data_v = data_v.astype(dtype, copy=False)
+        return data_v
+
+
+era5_cache = ERA5MonthCache()
+
+
+# downwelling longwave radiation (W/m2) from the accumulated ERA5 strd (J/m2)
+def read_area_era5_rld(era5_rld_grib, area_day, area_hour, lats, lons, cache=era5_cache, dtype=None):
+    step_idx = int(area_hour)-1
+    return cache.read_slice(era5_rld_grib, area_day, area_hour, lats, lons, "linear", dtype)/((step_idx+1)*3600)
+
+
+def read_area_era5_albedo(era5_grib, area_day, area_hour, lats, lons, cache=era5_cache, dtype=None):
+    return cache.read_slice(era5_grib, area_day, area_hour, lats, lons, "linear", dtype)
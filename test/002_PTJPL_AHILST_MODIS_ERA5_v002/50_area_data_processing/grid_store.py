@@ -0,0 +1,211 @@
+import os
+import sys
+import gzip
+import argparse
+import functools
+import threading
+from datetime import datetime, timedelta
+
+import numpy
+
+from amaterass_reader import read_AMATERASS_rows, AMATERASS_JP_SHAPE, AMATERASS_FD_SHAPE
+
+# solar_slots of the PT-JPL engine shared by all versions (test/ptjpl_engine)
+ENGINE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+if ENGINE_FOLDER not in sys.path:
+    sys.path.insert(0, ENGINE_FOLDER)
+
+from ptjpl_engine.solar_slots import any_daytime_mask, extent_points
+
+time_internal = 10  # mins
+SLOTS_PER_DAY = 24 * 60 // time_internal
+
+# product: (grid shape, source file relative to the product folder as strftime pattern of the UTC time)
+PRODUCTS = {
+    'AHILST_JP': ((1500, 1500), '%Y%m/AHILST.v0.%Y%m%d%H%M.dat.gz'), # 0.02°, 20-50°N 120-150°E
+    'AHILST_FD': ((6000, 6000), '%Y%m/AHILST.v0.%Y%m%d%H%M.dat.gz'), # 0.02°
+    'AMATERASS_SRd_JP': (AMATERASS_JP_SHAPE, '%Y%m/%Y%m%d/%Y%m%d%H%M.dwn.sw.flx.sfc.msm.1km.bin.bz2'),
+    'AMATERASS_RH_JP': (AMATERASS_JP_SHAPE, '%Y%m/%Y%m%d/%Y%m%d%H%M.rh.sfc.msm.1km.bin.bz2'),
+    'AMATERASS_Ta_JP': (AMATERASS_JP_SHAPE, '%Y%m/%Y%m%d/%Y%m%d%H%M.tsfc.msm.1km.bin.bz2'),
+    'AMATERASS_SRd_FD': (AMATERASS_FD_SHAPE, '%Y%m/%Y%m%d/%Y%m%d%H%M.dwn.sw.flx.sfc.fld.4km.bin.bz2'),
+}
+# (l_lon, r_lon, b_lat, t_lat) of the JP products, for their daytime slots (the full disk is never all in the night)
+AMATERASS_JP_EXTENT = (119.99, 150.0, 22.4, 47.61) # first pixel center 47.605°N 119.995°E
+PRODUCT_EXTENTS = {
+    'AHILST_JP': (120.0, 150.0, 20.0, 50.0),
+    'AMATERASS_SRd_JP': AMATERASS_JP_EXTENT,
+    'AMATERASS_RH_JP': AMATERASS_JP_EXTENT,
+    'AMATERASS_Ta_JP': AMATERASS_JP_EXTENT,
+}
+
+
+# The store keeps one (144, rows, cols) native float32 .npy stack per product and UTC day,
+# plus a (144,) bool .npy telling which 10-minute slots hold a frame:
+#   <store_folder>/<product>/<YYYYMM>/<YYYYMMDD>.npy
+#   <store_folder>/<product>/<YYYYMM>/<YYYYMMDD>_valid.npy
+# Frames are the decoded file contents (no unit conversion, AHI LST nodata stays -999).
+def day_filenames(store_folder, product, utc_time):
+    day_folder = os.path.join(store_folder, product, utc_time.strftime("%Y%m"))
+    day_str = utc_time.strftime("%Y%m%d")
+    return os.path.join(day_folder, day_str + '.npy'), os.path.join(day_folder, day_str + '_valid.npy')
+
+
+def time_slot(utc_time):
+    return (utc_time.hour * 60 + utc_time.minute) // time_internal
+
+
+def source_filename(source_folder, product, utc_time):
+    return os.path.join(source_folder, utc_time.strftime(PRODUCTS[product][1]))
+
+
+# decode one source file into a native float32 grid
+def decode_source_file(filename, shape):
+    if filename.endswith('.bz2'):
+        return read_AMATERASS_rows(filename, 0, shape[0], shape)
+    with gzip.open(filename, 'rb') as file:
+        gz_data = file.read()
+    return numpy.frombuffer(gz_data, dtype='f4').reshape(shape)
+
+
+@functools.lru_cache(maxsize=16)
+def open_day(stack_filename):
+    return numpy.load(stack_filename, mmap_mode='r')
+
+
+# frame of a UTC time as a read-only view into the day stack (no copy), None if it is not in the store
+def read_frame(store_folder, product, utc_time):
+    stack_filename, valid_filename = day_filenames(store_folder, product, utc_time)
+    if not os.path.exists(valid_filename):
+        return None
+    slot = time_slot(utc_time)
+    if not numpy.load(valid_filename)[slot]:
+        return None
+    return open_day(stack_filename)[slot]
+
+
+# frame from the store when it is there, decoded from the source file otherwise
+def read_product_frame(product, utc_time, source_folder, store_folder=None):
+    if store_folder:
+        frame = read_frame(store_folder, product, utc_time)
+        if frame is not None:
+            return frame
+    return decode_source_file(source_filename(source_folder, product, utc_time), PRODUCTS[product][0])
+
+
+# (144,) slots of a UTC day in which the sun is up somewhere in the extent of a JP product
+def daytime_slots(product, utc_day):
+    if product not in PRODUCT_EXTENTS:
+        raise ValueError('no extent for the daytime slots of ' + product + ', only of ' + str(sorted(PRODUCT_EXTENTS)))
+    day_start = numpy.datetime64(datetime(utc_day.year, utc_day.month, utc_day.day), 's')
+    slot_times = day_start + numpy.arange(SLOTS_PER_DAY) * numpy.timedelta64(time_internal * 60, 's')
+    return any_daytime_mask(slot_times, *extent_points(PRODUCT_EXTENTS[product]), slot_minutes=time_internal)
+
+
+# decode all frames of one UTC day into the store; missing or broken files stay NaN/invalid.
+# With daytime_only the slots in which the sun is up nowhere in the product extent are not decoded either
+# (NaN/invalid, read_product_frame reads them from the source files)
+def convert_day(store_folder, product, utc_day, source_folder, overwrite=False, daytime_only=False):
+    shape = PRODUCTS[product][0]
+    stack_filename, valid_filename = day_filenames(store_folder, product, utc_day)
+    if os.path.exists(valid_filename) and not overwrite:
+        return stack_filename
+    if not os.path.exists(os.path.dirname(stack_filename)):
+        os.makedirs(os.path.dirname(stack_filename))
+
+    day_start = datetime(utc_day.year, utc_day.month, utc_day.day)
+    stack = numpy.lib.format.open_memmap(stack_filename + '.part', mode='w+', dtype='f4', shape=(SLOTS_PER_DAY,) + shape)
+    valid = numpy.zeros(SLOTS_PER_DAY, dtype=bool)
+    slot_mask = daytime_slots(product, utc_day) if daytime_only else numpy.ones(SLOTS_PER_DAY, dtype=bool)
+    for slot in range(SLOTS_PER_DAY):
+        filename = source_filename(source_folder, product, day_start + timedelta(minutes=slot*time_internal))
+        if not slot_mask[slot] or not os.path.exists(filename):
+            stack[slot] = numpy.nan
+            continue
+        try:
+            stack[slot] = decode_source_file(filename, shape)
+            valid[slot] = True
+        except Exception as e:
+            print(filename)
+            print(e)
+            stack[slot] = numpy.nan
+    stack.flush()
+    del stack
+    os.replace(stack_filename + '.part', stack_filename)
+    open_day.cache_clear()
+    # the valid flags are written last, a day without them is not in the store
+    numpy.save(valid_filename, valid)
+    return stack_filename
+
+
+# product of a source file suffix, e.g. '.tsfc.msm.1km.bin.bz2' -> 'AMATERASS_Ta_JP'
+def product_of_suffix(file_suffix):
+    for product, (shape, pattern) in PRODUCTS.items():
+        if pattern.endswith(file_suffix):
+            return product
+    raise ValueError('no product for ' + file_suffix)
+
+
+class DayStackWriter:
+    """
+        Frames written one by one into the stack of a UTC day (e.g. while they are downloaded), from any thread.
+        A new stack starts all NaN; an existing one is opened for update and keeps its frames.
+        Every frame is flushed before its valid flag is saved, so readers never see a slot that is not complete.
+        """
+    def __init__(self, store_folder, product, utc_day):
+        self.shape = PRODUCTS[product][0]
+        self.stack_filename, self.valid_filename = day_filenames(store_folder, product, utc_day)
+        if not os.path.exists(os.path.dirname(self.stack_filename)):
+            os.makedirs(os.path.dirname(self.stack_filename), exist_ok=True)
+        if os.path.exists(self.stack_filename):
+            self.stack = numpy.load(self.stack_filename, mmap_mode='r+')
+        else:
+            self.stack = numpy.lib.format.open_memmap(self.stack_filename + '.part', mode='w+', dtype='f4',
+                                                      shape=(SLOTS_PER_DAY,) + self.shape)
+            self.stack[:] = numpy.nan
+            self.stack.flush()
+            os.replace(self.stack_filename + '.part', self.stack_filename)
+        self.valid = numpy.load(self.valid_filename) if os.path.exists(self.valid_filename) else numpy.zeros(SLOTS_PER_DAY, dtype=bool)
+        self.lock = threading.Lock()
+
+    def has_frame(self, utc_time):
+        return bool(self.valid[time_slot(utc_time)])
+
+    def write(self, utc_time, frame):
+        slot = time_slot(utc_time)
+        self.stack[slot] = frame
+        with self.lock:
+            self.stack.flush()
+            self.valid[slot] = True
+            numpy.save(self.valid_filename + '.part.npy', self.valid)
+            os.replace(self.valid_filename + '.part.npy', self.valid_filename)
+
+    def close(self):
+        self.stack.flush()
+        del self.stack
+        open_day.cache_clear()
+
+
+def convert_days(store_folder, product, utc_start_date, utc_end_date, source_folder, overwrite=False,
+                 daytime_only=False):
+    temp_date = utc_start_date
+    while temp_date < utc_end_date:
+        print(product + ' ' + temp_date.strftime("%Y-%m-%d"))
+        convert_day(store_folder, product, temp_date, source_folder, overwrite, daytime_only)
+        temp_date = temp_date + timedelta(days=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Decode AHI LST / AMATERASS files into per-day float32 stacks')
+    parser.add_argument('product', choices=sorted(PRODUCTS))
+    parser.add_argument('source_folder')
+    parser.add_argument('store_folder')
+    parser.add_argument('--start', required=True, help='first UTC day, e.g. 2018-07-19')
+    parser.add_argument('--end', required=True, help='last UTC day (included)')
+    parser.add_argument('--overwrite', action='store_true')
+    parser.add_argument('--daytime-only', action='store_true',
+                        help='only decode the slots with daylight somewhere in the extent of the (JP) product')
+    args = parser.parse_args()
+
+    convert_days(args.store_folder, args.product, datetime.strptime(args.start, "%Y-%m-%d"),
+                 datetime.strptime(args.end, "%Y-%m-%d") + timedelta(days=1), args.source_folder, args.overwrite,
+                 args.daytime_only)
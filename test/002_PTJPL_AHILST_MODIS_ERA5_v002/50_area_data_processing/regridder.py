@@ -0,0 +1,127 @@
+import os
+import hashlib
+
+import numpy
+
+REGRID_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'h8ahi_et_regrid')
+REGRID_METHODS = ('nearest', 'linear')
+
+
+# nearest source index of every target coordinate along one axis,
+# the same choice as xarray .interp(method="nearest", kwargs={"fill_value": "extrapolate"})
+# (scipy interp1d: halfway points go to the lower coordinate, outside points to the edge)
+def axis_nearest_indices(src, dst):
+    order = numpy.argsort(src, kind="mergesort")
+    x = numpy.asarray(src, dtype=float)[order]
+    x_bds = x / 2.0
+    x_bds = x_bds[1:] + x_bds[:-1]
+    x_idx = numpy.searchsorted(x_bds, dst, side='left').clip(0, len(x)-1)
+    return order[x_idx]
+
+
+# bracketing source indices and distances of every target coordinate along one axis,
+# the same interval and extrapolation as xarray .interp(method="linear", kwargs={"fill_value": "extrapolate"})
+def axis_linear_table(src, dst):
+    order = numpy.argsort(src, kind="mergesort")
+    x = numpy.asarray(src, dtype=float)[order]
+    x_idx = numpy.searchsorted(x, dst).clip(1, len(x)-1)
+    x_lo = x[x_idx-1]
+    x_hi = x[x_idx]
+    return order[x_idx-1], order[x_idx], x_hi - x_lo, numpy.asarray(dst, dtype=float) - x_lo
+
+
+# linear interpolation along one axis: (y_hi - y_lo) / (x_hi - x_lo) * (x_new - x_lo) + y_lo
+def remap_axis_linear(data, lo, hi, x_span, x_offset, axis):
+    shape = [1, 1]
+    shape[axis] = -1
+    y_lo = numpy.take(data, lo, axis=axis)
+    slope = (numpy.take(data, hi, axis=axis) - y_lo) / x_span.reshape(shape)
+    return slope * x_offset.reshape(shape) + y_lo
+
+
+class Regridder:
+    """
+        Remaps (rows, cols) frames from a fixed source grid onto a fixed target grid (1-D y/x coordinates).
+        The index (and for 'linear' the distance) tables are computed once; every frame is then
+        one take ('nearest') or two weighted takes ('linear', along x and then along y as
+        xarray does), giving the same values as xarray .interp(x=..., y=..., method=...,
+        kwargs={"fill_value": "extrapolate"}).
+        """
+    def __init__(self, src_y, src_x, dst_y, dst_x, method='nearest', tables=None):
+        if method not in REGRID_METHODS:
+            raise ValueError('method must be one of ' + str(REGRID_METHODS) + ', got ' + str(method))
+        self.method = method
+        self.src_shape = (len(src_y), len(src_x))
+        self.dst_shape = (len(dst_y), len(dst_x))
+        if tables is None:
+            if method == 'nearest':
+                tables = {'y_idx': axis_nearest_indices(src_y, dst_y), 'x_idx': axis_nearest_indices(src_x, dst_x)}
+            else:
+                tables = {}
+                for axis_name, src, dst in [('y', src_y, dst_y), ('x', src_x, dst_x)]:
+                    lo, hi, x_span, x_offset = axis_linear_table(src, dst)
+                    tables.update({axis_name + '_lo': lo, axis_name + '_hi': hi,
+                                   axis_name + '_span': x_span, axis_name + '_offset': x_offset})
+        self.tables = tables
+        if method == 'nearest':
+            index_dtype = numpy.int32 if self.src_shape[0] * self.src_shape[1] < 2**31 else numpy.int64
+            self.flat_indices = (tables['y_idx'][:, None] * self.src_shape[1] + tables['x_idx'][None, :]).astype(index_dtype)
+
+    def __call__(self, frame):
+        frame = numpy.asarray(frame)
+        if frame.shape != self.src_shape:
+            raise ValueError('frame shape ' + str(frame.shape) + ' does not match the source grid ' + str(self.src_shape))
+        # like scipy interp1d, integer data (e.g. MODIS DN) is interpolated as float64
+        if not numpy.issubdtype(frame.dtype, numpy.inexact):
+            frame = frame.astype(numpy.float64)
+        if self.method == 'nearest':
+            return numpy.take(frame.reshape(-1), self.flat_indices)
+        t = self.tables
+        x_data = remap_axis_linear(frame, t['x_lo'], t['x_hi'], t['x_span'], t['x_offset'], axis=1)
+        return remap_axis_linear(x_data, t['y_lo'], t['y_hi'], t['y_span'], t['y_offset'], axis=0)
+
+    def save(self, filename):
+        numpy.savez(filename, method=self.method, src_shape=self.src_shape, dst_shape=self.dst_shape, **self.tables)
+
+    @classmethod
+    def load(cls, filename):
+        with numpy.load(filename) as npz:
+            tables = {key: npz[key] for key in npz.files if key not in ('method', 'src_shape', 'dst_shape')}
+            src_shape, dst_shape, method = tuple(npz['src_shape']), tuple(npz['dst_shape']), str(npz['method'])
+        return cls(range(src_shape[0]), range(src_shape[1]), range(dst_shape[0]), range(dst_shape[1]), method, tables)
+
+
+def regrid_key(src_y, src_x, dst_y, dst_x, method):
+    key = hashlib.sha1(method.encode())
+    for coordinates in (src_y, src_x, dst_y, dst_x):
+        key.update(numpy.ascontiguousarray(coordinates, dtype=float).tobytes())
+        key.update(b'|')
+    return key.hexdigest()
+
+
+regridders = {}
+
+
+# Regridder for a (source grid, target grid, method), from memory, the disk cache or built and cached
+def get_regridder(src_y, src_x, dst_y, dst_x, method='nearest', cache_folder=REGRID_CACHE_FOLDER):
+    key = regrid_key(src_y, src_x, dst_y, dst_x, method)
+    if key in regridders:
+        return regridders[key]
+
+    cache_filename = os.path.join(cache_folder, key + '.npz') if cache_folder else None
+    regridder = None
+    if cache_filename and os.path.exists(cache_filename):
+        try:
+            regridder = Regridder.load(cache_filename)
+        except Exception as e:
+            print(cache_filename)
+            print(e)
+    if regridder is None:
+        regridder = Regridder(src_y, src_x, dst_y, dst_x, method)
+        if cache_filename:
+            if not os.path.exists(cache_folder):
+                os.makedirs(cache_folder)
+            regridder.save(cache_filename + '.part.npz')
+            os.replace(cache_filename + '.part.npz', cache_filename)
+    regridders[key] = regridder
+    return regridder
@@ -0,0 +1,118 @@
+import os
+
+import numpy
+import xarray
+
+from regridder import get_regridder
+from era5_reader import read_area_era5_albedo
+
+STATIC_LAYERS_SUFFIX = '_static_layers.npz'
+STATIC_LAYER_NAMES = ('emis_bbe', 'ndvi_land', 'land_mask')
+
+
+def utc_doy_str(utc_time):
+    return utc_time.strftime("%j")
+
+
+def emis_filenames(emis_folder, utc_time):
+    year = utc_time.strftime("%Y")
+    return [os.path.join(emis_folder, year, 'MOD21A1D.061_Emis_' + band + '_doy' + year + utc_doy_str(utc_time) + '_aid0001.tif')
+            for band in ['29', '31', '32']]
+
+
+def ndvi_filename(ndvi_folder, utc_time):
+    return os.path.join(ndvi_folder, utc_time.strftime("%Y"), utc_doy_str(utc_time) + '.npy')
+
+
+def albedo_filename(albedo_folder, utc_time):
+    return os.path.join(albedo_folder, utc_time.strftime("%Y") + '_' + utc_time.strftime("%m") + '.grib')
+
+
+def read_emis(modis_emis_tif, lats, lons):
+    modis_ds = xarray.open_rasterio(modis_emis_tif)[0]
+    emis_regridder = get_regridder(modis_ds.y.values, modis_ds.x.values, lats, lons, "nearest")
+    emis_dn = emis_regridder(modis_ds.values).astype(float)
+    emis_dn[emis_dn==0] = numpy.nan
+    data_v = emis_dn*0.002+0.49
+    return data_v
+
+
+def calculate_BBE(band29_emis, band31_emis, band32_emis):
+    bbe = 0.227 + 0.188*band29_emis + 0.217*band31_emis + 0.359*band32_emis
+    return bbe
+
+
+def read_ndvi_npy(ndvi_npy, lats, lons, ndvi_resolution=0.01):
+    ndvi_array = numpy.load(ndvi_npy)
+    ndvi_regridder = get_regridder(numpy.arange(50-ndvi_resolution/2, 20, -ndvi_resolution),
+                                   numpy.arange(120.+ndvi_resolution/2, 150, ndvi_resolution), lats, lons, "nearest")
+    ndvi_v = ndvi_regridder(ndvi_array).astype(float)
+    ndvi_v[ndvi_v>1] = numpy.nan
+    ndvi_v[ndvi_v<0] = numpy.nan
+    return ndvi_v
+
+
+# 1 over land, NaN over sea (where ERA5-Land albedo has no value)
+def land_mask_from_albedo(albedo_area):
+    land_mask = numpy.copy(albedo_area)
+    land_mask[~numpy.isnan(land_mask)] = 1
+    return land_mask
+
+
+# broadband emissivity, NDVI on land and land mask of the UTC day of utc_time in dtype
+# (emissivity and NDVI of the day of year, land mask from the albedo slice of utc_time)
+def compute_static_layers(utc_time, lats, lons, emis_folder, ndvi_folder, albedo_folder, dtype=float):
+    emis29_v, emis31_v, emis32_v = [read_emis(emis_tif, lats, lons) for emis_tif in emis_filenames(emis_folder, utc_time)]
+    albedo_area = read_area_era5_albedo(albedo_filename(albedo_folder, utc_time), utc_time.strftime("%d"),
+                                        utc_time.strftime("%H"), lats, lons)
+    land_mask = land_mask_from_albedo(albedo_area)
+    ndvi_area = read_ndvi_npy(ndvi_filename(ndvi_folder, utc_time), lats, lons)
+    layers = {
+        'emis_bbe': calculate_BBE(emis29_v, emis31_v, emis32_v),
+        'ndvi_land': ndvi_area*land_mask,
+        'land_mask': land_mask,
+    }
+    return {name: layer.astype(dtype, copy=False) for name, layer in layers.items()}
+
+
+def static_layers_filename(cache_folder, utc_time):
+    return os.path.join(cache_folder, utc_time.strftime("%Y%m%d") + STATIC_LAYERS_SUFFIX)
+
+
+class DailyStaticLayers:
+    """
+        Static layers of the UTC day of the time steps asked for: kept in memory for the steps of the same day,
+        read from <cache_folder>/<YYYYMMDD>_static_layers.npz when another process already made them,
+        and computed (and saved there) once otherwise.
+        The day files are what ptjpl_area_scheduler.cached_static_layers publishes to its workers.
+        The layers are returned in dtype ('float32' for the float32 chain of the area runs).
+        """
+    def __init__(self, lats, lons, emis_folder, ndvi_folder, albedo_folder, cache_folder=None, dtype=float):
+        self.lats = lats
+        self.lons = lons
+        self.emis_folder = emis_folder
+        self.ndvi_folder = ndvi_folder
+        self.albedo_folder = albedo_folder
+        self.cache_folder = cache_folder
+        self.dtype = dtype
+        self.day = None
+        self.layers = None
+
+    def get(self, utc_time):
+        if self.day == utc_time.date():
+            return self.layers
+        layers_filename = static_layers_filename(self.cache_folder, utc_time) if self.cache_folder else None
+        if layers_filename and os.path.exists(layers_filename):
+            with numpy.load(layers_filename) as npz:
+                layers = {name: npz[name].astype(self.dtype, copy=False) for name in npz.files}
+        else:
+            layers = compute_static_layers(utc_time, self.lats, self.lons, self.emis_folder, self.ndvi_folder,
+                                           self.albedo_folder, self.dtype)
+            if layers_filename:
+                if not os.path.exists(self.cache_folder):
+                    os.makedirs(self.cache_folder)
+                numpy.savez(layers_filename + '.part.npz', **layers)
+                os.replace(layers_filename + '.part.npz', layers_filename)
+        self.day = utc_time.date()
+        self.layers = layers
+        return layers
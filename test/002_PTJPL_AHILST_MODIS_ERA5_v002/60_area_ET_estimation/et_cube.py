@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import xarray
+
+from ptjpl_ecostress_area import AREA_OUTPUTS
+from ptjpl_area_tiled import extent_coordinates
+
+# JP extent of the area inputs (01_PTJPL_model_run.ipynb)
+JP_EXTENT = (120.0, 150.0, 22.5, 47.5) # l_lon, r_lon, b_lat, t_lat
+JP_RESOLUTION = 0.01 # degree
+DEFAULT_CHUNK_ROWS = 250
+DEFAULT_CHUNK_COLS = 300
+CUBE_DIMS = ('time', 'band', 'lat', 'lon')
+CUBE_VARIABLE = 'et'
+# on-disk type of the cube values: float32, or int16 of 0.1 W/m2 (-3276.7 to 3276.7 W/m2, NaN as the fill value)
+CUBE_ENCODINGS = {
+    'float32': {'dtype': 'float32'},
+    'int16': {'dtype': 'int16', 'scale_factor': 0.1, 'add_offset': 0., '_FillValue': -32768},
+}
+TIME_ENCODING = {'units': 'minutes since 1970-01-01 00:00:00', 'calendar': 'standard', 'dtype': 'int64'}
+# zarr v2 stores _FillValue as the fill value of the array, so the chunks not written yet read as NaN
+ZARR_FORMAT = 2
+
+
+# time steps as the UTC datetime64 values of the time coordinate
+def cube_times(time_steps):
+    return np.array(time_steps, dtype='datetime64[ns]')
+
+
+# lazy cube of NaN for the time steps (needs dask): nothing but the metadata and coordinates is written
+def empty_cube(time_steps, lats, lons, chunk_rows, chunk_cols):
+    import dask.array
+
+    chunks = (1, len(AREA_OUTPUTS), chunk_rows, chunk_cols)
+    shape = (len(time_steps), len(AREA_OUTPUTS), len(lats), len(lons))
+    et = dask.array.full(shape, np.nan, dtype='float32', chunks=chunks)
+    return xarray.Dataset(
+        {CUBE_VARIABLE: (CUBE_DIMS, et, {'long_name': 'PT-JPL latent heat flux', 'units': 'W m-2'})},
+        coords={
+            'time': ('time', cube_times(time_steps), {'standard_name': 'time', 'long_name': 'UTC time of the step'}),
+            'band': ('band', np.array(AREA_OUTPUTS), {'long_name': 'PT-JPL output'}),
+            'lat': ('lat', np.asarray(lats), {'standard_name': 'latitude', 'units': 'degrees_north'}),
+            'lon': ('lon', np.asarray(lons), {'standard_name': 'longitude', 'units': 'degrees_east'}),
+        },
+        attrs={'Conventions': 'CF-1.8', 'title': 'PT-JPL area ET, one time step per 10 minutes'})
+
+
+def open_et_cube(store, time_steps, lats=None, lons=None, encoding='int16', chunk_rows=DEFAULT_CHUNK_ROWS,
+                 chunk_cols=DEFAULT_CHUNK_COLS):
+    """
+        Creates the (time, band, lat, lon) zarr cube of the area ET, or appends the time steps after its
+        last one: the time steps get their place in the cube here, in one process, and the values stay
+        unwritten (fill value, no chunk on disk) until write_et_step. Each time step is its own chunk along
+        time, so pool workers write different steps at the same time without a lock.
+        The chunks are compressed with the zarr default compressor.
+
+        :param time_steps:
+            UTC datetimes of the steps, in increasing order; steps already in the cube keep their place
+        :param lats, lons:
+            Pixel centers of the grid when the cube is created, the JP grid when None
+        :param encoding:
+            'int16' or 'float32' type of the values in the cube (CUBE_ENCODINGS)
+        :param chunk_rows, chunk_cols:
+            Spatial chunk of the cube, all AREA_OUTPUTS of a step are in the same chunk
+
+        :return:
+            {time step: index on the time axis of the cube}
+        """
+    if encoding not in CUBE_ENCODINGS:
+        raise ValueError('encoding must be one of ' + str(list(CUBE_ENCODINGS)) + ', got ' + str(encoding))
+    new_times = cube_times(time_steps)
+    if len(new_times) > 1 and np.any(np.diff(new_times) <= np.timedelta64(0)):
+        raise ValueError('time_steps must be increasing')
+
+    if not os.path.exists(store):
+        if lats is None or lons is None:
+            lats, lons = extent_coordinates(JP_EXTENT, JP_RESOLUTION)
+        cube_encoding = dict(CUBE_ENCODINGS[encoding], chunks=(1, len(AREA_OUTPUTS), chunk_rows, chunk_cols))
+        empty_cube(time_steps, lats, lons, chunk_rows, chunk_cols).to_zarr(
+            store, mode='w-', compute=False, encoding={CUBE_VARIABLE: cube_encoding, 'time': TIME_ENCODING},
+            zarr_format=ZARR_FORMAT)
+        return {time_step: index for index, time_step in enumerate(time_steps)}
+
+    with xarray.open_zarr(store) as cube:
+        times = cube['time'].values
+        lats, lons = cube['lat'].values, cube['lon'].values
+        chunk_rows, chunk_cols = cube[CUBE_VARIABLE].encoding['chunks'][2:]
+    append = [time_step for time_step, in_cube in zip(time_steps, np.isin(new_times, times)) if not in_cube]
+    if append and len(times) and cube_times(append)[0] <= times[-1]:
+        raise ValueError('time steps not in the cube can only be appended after its last one, ' + str(times[-1]))
+    if append:
+        empty_cube(append, lats, lons, chunk_rows, chunk_cols).drop_vars(['band', 'lat', 'lon']).to_zarr(
+            store, append_dim='time', compute=False, zarr_format=ZARR_FORMAT)
+        times = np.concatenate([times, cube_times(append)])
+
+    indexes = {time: index for index, time in enumerate(times)}
+    return {time_step: indexes[time] for time_step, time in zip(time_steps, new_times)}
+
+
+# writes the (5, rows, cols) ptjpl_area results of a step at its index of open_et_cube (any process)
+def write_et_step(store, time_index, et_array):
+    step = xarray.Dataset({CUBE_VARIABLE: (CUBE_DIMS, np.asarray(et_array, dtype='float32')[None])})
+    step.to_zarr(store, region={'time': slice(time_index, time_index + 1)}, consolidated=False,
+                 zarr_format=ZARR_FORMAT)
@@ -0,0 +1,349 @@
+import os
+import sys
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# solar_slots of the PT-JPL engine shared by all versions (test/ptjpl_engine)
+ENGINE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+if ENGINE_FOLDER not in sys.path:
+    sys.path.insert(0, ENGINE_FOLDER)
+
+from ptjpl_ecostress_area import ptjpl_area_fused, ptjpl_area_jit, DailyET
+from ptjpl_engine.solar_slots import grid_daytime_mask
+from et_cube import open_et_cube, write_et_step, JP_EXTENT, JP_RESOLUTION
+from ptjpl_area_tiled import extent_coordinates
+
+START_TIME = '2018-07-19T00:00:00Z' # local time
+END_TIME = '2018-07-19T23:59:59Z'
+
+UTC_OFFSET = 9 # hour
+time_internal = 10  # mins
+
+INPUT_FOLDER = '/data01/people/beichen/workspace/20231124'
+OUTPUT_FOLDER = '/data01/people/beichen/workspace/20231124'
+
+INPUT_SUFFIXES = {
+    'r_net': '_input_jp_r_net.npy',
+    'rh': '_input_jp_rh.npy',
+    'ta': '_input_jp_ta.npy',
+    'ndvi': '_input_jp_ndvi.npy',
+}
+OUTPUT_SUFFIX = '_output_jp_et.npy'
+# daily maps of DailyET.products per local day: <YYYYMMDD>_output_jp_daily_et.npz
+DAILY_OUTPUT_SUFFIX = '_output_jp_daily_et.npz'
+# day files of 50_area_data_processing/static_layers.py: <YYYYMMDD>_static_layers.npz
+STATIC_LAYERS_SUFFIX = '_static_layers.npz'
+
+# per-process state of the pool workers: attached shared layers and the reused output buffer
+worker_state = {'shared_memory': {}, 'layers': {}, 'out': None}
+
+
+# UTC times of the 10-minute steps between two local times (end excluded)
+def area_time_steps(start_localtime, end_localtime, utc_offset=UTC_OFFSET, time_internal=time_internal):
+    utc_start_date = datetime.strptime(start_localtime, "%Y-%m-%dT%H:%M:%SZ") - timedelta(hours=utc_offset)
+    utc_end_date = datetime.strptime(end_localtime, "%Y-%m-%dT%H:%M:%SZ") - timedelta(hours=utc_offset)
+
+    time_steps = []
+    temp_date = utc_start_date
+    while temp_date < utc_end_date:
+        time_steps.append(temp_date)
+        temp_date = temp_date + timedelta(minutes=time_internal)
+    return time_steps
+
+
+def area_filename(folder, area_utc_time, suffix):
+    return os.path.join(folder, area_utc_time.strftime("%Y%m%d%H%M") + suffix)
+
+
+# static layers of one UTC day: the NDVI input does not change within a day, read it once from the first step
+def read_daily_ndvi(input_folder, day_time_steps):
+    for area_utc_time in day_time_steps:
+        ndvi_filename = area_filename(input_folder, area_utc_time, INPUT_SUFFIXES['ndvi'])
+        if os.path.exists(ndvi_filename):
+            return {'ndvi': np.load(ndvi_filename)}
+    return {}
+
+
+# daily_static_layers hook of the day files written by static_layers.DailyStaticLayers (broadband emissivity,
+# NDVI on land and land mask made once per UTC day); days without a file fall back to read_daily_ndvi
+def cached_static_layers(static_layers_folder, names=('emis_bbe', 'ndvi_land', 'land_mask')):
+    def read_day(input_folder, day_time_steps):
+        layers_filename = os.path.join(static_layers_folder, day_time_steps[0].strftime("%Y%m%d") + STATIC_LAYERS_SUFFIX)
+        if not os.path.exists(layers_filename):
+            return read_daily_ndvi(input_folder, day_time_steps)
+        with np.load(layers_filename) as npz:
+            return {name: npz[name] for name in names if name in npz.files}
+    return read_day
+
+
+# pixel centers (lats, lons) of the grid of the inputs, the JP grid when they are not given;
+# checked against the shape of the first r_net input of the steps
+def input_grid_coordinates(input_folder, time_steps, lats=None, lons=None):
+    if lats is None or lons is None:
+        lats, lons = extent_coordinates(JP_EXTENT, JP_RESOLUTION)
+    for area_utc_time in time_steps:
+        r_net_filename = area_filename(input_folder, area_utc_time, INPUT_SUFFIXES['r_net'])
+        if os.path.exists(r_net_filename):
+            input_shape = np.load(r_net_filename, mmap_mode='r').shape
+            if input_shape != (len(lats), len(lons)):
+                raise ValueError('inputs of shape ' + str(input_shape) + ' are not on the grid of ' + str(len(lats))
+                                 + ' lats and ' + str(len(lons)) + ' lons, give the lats and lons of their grid')
+            break
+    return np.asarray(lats), np.asarray(lons)
+
+
+# {UTC time step: True when the sun is up at some pixel of the grid (lats, lons)} (solar_slots.grid_daytime_mask)
+def daytime_steps(time_steps, lats, lons, time_internal=time_internal):
+    slot_mask = grid_daytime_mask(np.array(time_steps, dtype='datetime64[s]'), lats, lons, time_internal)
+    return dict(zip(time_steps, slot_mask.tolist()))
+
+
+class SharedLayers:
+    """
+        Static layers (NDVI, land mask, emissivity ...) copied once into shared memory.
+        specs is what the workers need to map them: {name: (shared memory name, shape, dtype)}.
+        """
+    def __init__(self, layers):
+        self.shared_memory = []
+        self.specs = {}
+        for name, layer in layers.items():
+            layer = np.asarray(layer)
+            shm = shared_memory.SharedMemory(create=True, size=max(layer.nbytes, 1))
+            np.ndarray(layer.shape, dtype=layer.dtype, buffer=shm.buf)[...] = layer
+            self.shared_memory.append(shm)
+            self.specs[name] = (shm.name, layer.shape, layer.dtype.str)
+
+    def close(self):
+        for shm in self.shared_memory:
+            shm.close()
+            shm.unlink()
+        self.shared_memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# map the shared layers in a worker, keeping the ones already attached
+def attach_layers(layer_specs):
+    attached = worker_state['shared_memory']
+    for shm_name in list(attached):
+        if shm_name not in [spec[0] for spec in layer_specs.values()]:
+            attached.pop(shm_name).close()
+
+    layers = {}
+    for name, (shm_name, shape, dtype) in layer_specs.items():
+        if shm_name not in attached:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            # the parent owns (and unlinks) the block: the workers share its resource tracker (forked after
+            # run_area_time_range started it, or handed its fd by spawn / forkserver), so attaching registers the
+            # block there again without a second owner, and unregistering would drop the parent's registration
+            attached[shm_name] = shm
+        layers[name] = np.ndarray(shape, dtype=dtype, buffer=attached[shm_name].buf)
+    worker_state['layers'] = layers
+    return layers
+
+
+def run_area_time_step(task, daily_et=None, utc_offset=UTC_OFFSET):
+    """
+        :param task:
+            (area_utc_time, input_folder, output_folder, layer_specs, dtype, jit, cube, daytime) with cube None
+            for a step file or (cube store, time index of the step) for et_cube.write_et_step; a step that is
+            not daytime is not evaluated, only its net radiation is folded into daily_et
+        :param daily_et:
+            Optional {local date: DailyET} the results of the step are folded into
+
+        :return:
+            the step file or the time index in the cube, None when an input is missing or the step is not daytime
+        """
+    area_utc_time, input_folder, output_folder, layer_specs, dtype, jit, cube, daytime = task
+    layers = attach_layers(layer_specs)
+
+    input_names = ['r_net', 'rh', 'ta'] if daytime else ['r_net']
+    input_filenames = [area_filename(input_folder, area_utc_time, INPUT_SUFFIXES[name]) for name in input_names]
+    if 'ndvi' not in layers and 'ndvi_land' not in layers:
+        input_filenames.append(area_filename(input_folder, area_utc_time, INPUT_SUFFIXES['ndvi']))
+    try:
+        inputs = [np.load(input_filename) for input_filename in input_filenames]
+    except Exception as e:
+        print(area_utc_time.strftime("%Y%m%d%H%M"))
+        print(e)
+        return None
+    r_net_area = inputs[0]
+    if 'ndvi_land' in layers:
+        # already masked to land when the day's layers were made
+        ndvi_area = layers['ndvi_land']
+    else:
+        ndvi_area = layers['ndvi'] if 'ndvi' in layers else inputs[-1]
+        if 'land_mask' in layers:
+            ndvi_area = ndvi_area * layers['land_mask']
+
+    out = worker_state['out']
+    if out is None or out.shape != (5,) + r_net_area.shape or out.dtype != dtype:
+        out = worker_state['out'] = np.empty((5,) + r_net_area.shape, dtype=dtype)
+    if not daytime:
+        out[...] = np.nan
+    elif jit:
+        ptjpl_area_jit(r_net_area, inputs[1], inputs[2], ndvi_area, out=out, dtype=dtype)
+    else:
+        ptjpl_area_fused(r_net_area, inputs[1], inputs[2], ndvi_area, out=out, dtype=dtype)
+
+    if not daytime:
+        output = None
+    elif cube is None:
+        output = area_filename(output_folder, area_utc_time, OUTPUT_SUFFIX)
+        np.save(output, out)
+    else:
+        cube_store, output = cube
+        write_et_step(cube_store, output, out)
+    if daily_et is not None:
+        local_date = (area_utc_time + timedelta(hours=utc_offset)).date()
+        if local_date not in daily_et:
+            daily_et[local_date] = DailyET(r_net_area.shape)
+        daily_et[local_date].add(out, r_net_area, ndvi_area)
+    return output
+
+
+# consecutive time steps in one worker, (tasks, utc_offset) -> (output files, {local date: DailyET of these steps})
+def run_area_time_steps(chunk):
+    tasks, utc_offset = chunk
+    daily_et = {}
+    output_filenames = [run_area_time_step(task, daily_et, utc_offset) for task in tasks]
+    return output_filenames, daily_et
+
+
+def save_daily_et(daily_folder, local_date, daily_et):
+    daily_filename = os.path.join(daily_folder, local_date.strftime("%Y%m%d") + DAILY_OUTPUT_SUFFIX)
+    np.savez(daily_filename, **daily_et.products())
+    return daily_filename
+
+
+def run_area_time_range(start_localtime, end_localtime, input_folder=INPUT_FOLDER, output_folder=OUTPUT_FOLDER,
+                        processes=None, daily_static_layers=read_daily_ndvi, utc_offset=UTC_OFFSET,
+                        time_internal=time_internal, verbose=True, dtype='float64', jit=False, daily_folder=None,
+                        cube_store=None, cube_encoding='int16', lats=None, lons=None, daytime_only=False):
+    """
+        Runs ptjpl_area for every time step between two local times on a pool of processes.
+        The pool is created once; for each UTC day the static layers returned by
+        daily_static_layers(input_folder, day_time_steps) are placed in shared memory and
+        mapped by the workers instead of being read again for each step.
+        With dtype='float32' the model runs and the outputs are saved in float32
+        (ptjpl_engine.check_float32 bounds the difference to float64).
+        With jit=True every step runs the numba kernel, which spreads its rows over the cores itself:
+        use few processes then (e.g. processes=1 for one full-disk frame at a time).
+        With a daily_folder every worker also folds its steps into DailyET accumulators of their local day
+        (the steps of a UTC day are split in one run of consecutive steps per process), the parent merges
+        them and saves the daily maps of each local day once its last step is done.
+        With a cube_store the steps are written into the compressed zarr cube of et_cube instead of
+        one .npy file each ('int16' or 'float32' cube_encoding): the steps are added to the cube
+        before the pool starts, then every worker writes its own steps. A new cube gets the lats and lons
+        of the pixel centers of the input grid (the JP grid when None), checked against the shape of the inputs.
+        With daytime_only the steps in which the sun is up nowhere on that grid (daytime_steps) are skipped:
+        no step file, NaN in the cube. With a daily_folder their net radiation is still read into the daily
+        maps, so daily_radiation is that of all the steps, the means of the outputs are those of the daytime steps.
+
+        :return:
+            list of the written output files, or of the time indexes in the cube_store
+            (None for steps with missing inputs and skipped night steps)
+        """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    days = {}
+    for area_utc_time in area_time_steps(start_localtime, end_localtime, utc_offset, time_internal):
+        days.setdefault(area_utc_time.date(), []).append(area_utc_time)
+
+    if daily_folder is not None and not os.path.exists(daily_folder):
+        os.makedirs(daily_folder)
+    # UTC time of the last step of each local day, the day's maps are complete after it
+    last_steps = {}
+    for day_time_steps in days.values():
+        for area_utc_time in day_time_steps:
+            last_steps[(area_utc_time + timedelta(hours=utc_offset)).date()] = area_utc_time
+
+    time_steps = [step for steps in days.values() for step in steps]
+    if cube_store is not None or daytime_only:
+        lats, lons = input_grid_coordinates(input_folder, time_steps, lats, lons)
+    daytime = daytime_steps(time_steps, lats, lons, time_internal) if daytime_only else dict.fromkeys(time_steps, True)
+    if daytime_only and verbose:
+        print(str(sum(daytime.values())) + ' of ' + str(len(time_steps)) + ' time steps in daytime')
+
+    cube_indexes = {}
+    if cube_store is not None:
+        cube_indexes = open_et_cube(cube_store, time_steps, lats, lons, encoding=cube_encoding)
+
+    output_filenames = []
+    daily_et = {}
+    # started before the pool, so forked workers share it with the parent instead of starting their own (attach_layers)
+    resource_tracker.ensure_running()
+    with multiprocessing.Pool(processes) as pool:
+        n_chunks = processes or os.cpu_count() or 1
+        for day, day_time_steps in days.items():
+            if verbose:
+                print(day.strftime("%Y-%m-%d") + ': ' + str(len(day_time_steps)) + ' time steps')
+            with SharedLayers(daily_static_layers(input_folder, day_time_steps)) as shared_layers:
+                tasks = [(area_utc_time, input_folder, output_folder, shared_layers.specs, dtype, jit,
+                          (cube_store, cube_indexes[area_utc_time]) if cube_store is not None else None,
+                          daytime[area_utc_time])
+                         for area_utc_time in day_time_steps]
+                if daily_folder is None:
+                    # night steps are not even sent to the pool
+                    day_outputs = iter(pool.map(run_area_time_step, [task for task in tasks if task[-1]]))
+                    output_filenames.extend(next(day_outputs) if task[-1] else None for task in tasks)
+                else:
+                    chunk_size = -(-len(tasks) // n_chunks)
+                    chunks = [(tasks[i:i+chunk_size], utc_offset) for i in range(0, len(tasks), chunk_size)]
+                    for chunk_filenames, chunk_daily_et in pool.map(run_area_time_steps, chunks):
+                        output_filenames.extend(chunk_filenames)
+                        for local_date, day_et in chunk_daily_et.items():
+                            if local_date in daily_et:
+                                daily_et[local_date].merge(day_et)
+                            else:
+                                daily_et[local_date] = day_et
+            for local_date in [d for d in daily_et if last_steps[d] <= day_time_steps[-1]]:
+                daily_filename = save_daily_et(daily_folder, local_date, daily_et.pop(local_date))
+                if verbose:
+                    print(daily_filename)
+    return output_filenames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='PT-JPL area ET for a range of 10-minute time steps')
+    parser.add_argument('--start', default=START_TIME, help='local start time, e.g. 2018-07-19T00:00:00Z')
+    parser.add_argument('--end', default=END_TIME, help='local end time (excluded)')
+    parser.add_argument('--input', default=INPUT_FOLDER)
+    parser.add_argument('--output', default=OUTPUT_FOLDER)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--utc-offset', type=int, default=UTC_OFFSET)
+    parser.add_argument('--time-internal', type=int, default=time_internal)
+    parser.add_argument('--static-layers', default=None,
+                        help='folder of the <YYYYMMDD>_static_layers.npz day files (NDVI on land, land mask)')
+    parser.add_argument('--dtype', default='float64', choices=['float64', 'float32'],
+                        help='type of the calculation and of the saved outputs')
+    parser.add_argument('--jit', action='store_true',
+                        help='run the numba kernel (ptjpl_area_jit, rows over all cores), with --processes 1')
+    parser.add_argument('--daily', default=None,
+                        help='folder of the <YYYYMMDD>_output_jp_daily_et.npz daily maps (local days), none when not set')
+    parser.add_argument('--cube', default=None,
+                        help='zarr store of the (time, band, lat, lon) cube written instead of the .npy step files')
+    parser.add_argument('--cube-encoding', default='int16', choices=['int16', 'float32'],
+                        help='type of the values in the cube, int16 of 0.1 W/m2 or float32')
+    parser.add_argument('--extent', type=float, nargs=4, default=None, metavar=('L_LON', 'R_LON', 'B_LAT', 'T_LAT'),
+                        help='extent of the input grid for the cube coordinates, the JP extent when not set')
+    parser.add_argument('--resolution', type=float, default=JP_RESOLUTION, help='pixel size of the input grid (degree)')
+    parser.add_argument('--daytime-only', action='store_true',
+                        help='skip the time steps in which the sun is up nowhere on the input grid')
+    args = parser.parse_args()
+
+    lats, lons = extent_coordinates(args.extent, args.resolution) if args.extent else (None, None)
+    daily_static_layers = cached_static_layers(args.static_layers, ('ndvi_land', 'land_mask')) if args.static_layers else read_daily_ndvi
+    run_area_time_range(args.start, args.end, args.input, args.output, args.processes, daily_static_layers,
+                        utc_offset=args.utc_offset, time_internal=args.time_internal, dtype=args.dtype,
+                        jit=args.jit, daily_folder=args.daily, cube_store=args.cube, cube_encoding=args.cube_encoding,
+                        lats=lats, lons=lons, daytime_only=args.daytime_only)
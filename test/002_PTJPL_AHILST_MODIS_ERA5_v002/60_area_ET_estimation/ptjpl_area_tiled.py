@@ -0,0 +1,129 @@
+import numpy as np
+
+from ptjpl_ecostress_area import (DEFAULT_BLOCK_ROWS, DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE,
+                                  DEFAULT_OPTIMUM_TEMPERATURE, fAPARmax_from_ndvi, ptjpl_area_fused, ptjpl_area_jit)
+
+# FD 180 extent
+FD_EXTENT = (85.0, 180.0, -60, 60) # l_lon, r_lon, b_lat, t_lat
+FD_RESOLUTION = 0.02 # degree, AHI LST
+DEFAULT_MEMORY_LIMIT = 2 * 1024**3 # bytes for one tile: inputs, outputs and kernel buffers
+N_INPUTS = 4
+N_OUTPUTS = 5
+N_KERNEL_BUFFERS = 15 # block-sized buffers of ptjpl_area_fused
+
+
+# grid coordinates (pixel centers) of an extent, north to south and west to east
+def extent_coordinates(extent=FD_EXTENT, resolution=FD_RESOLUTION):
+    rows = int(round((extent[3] - extent[2]) / resolution))
+    cols = int(round((extent[1] - extent[0]) / resolution))
+    lats = extent[3] - resolution/2 - np.arange(rows) * resolution
+    lons = extent[0] + resolution/2 + np.arange(cols) * resolution
+
+    return lats, lons
+
+
+# largest tile (rows, cols) whose inputs, outputs and kernel buffers fit into memory_limit
+def tile_shape_for_memory(grid_shape, memory_limit=DEFAULT_MEMORY_LIMIT, tile_cols=None, block_rows=DEFAULT_BLOCK_ROWS, itemsize=8):
+    rows, cols = grid_shape
+    tile_cols = cols if tile_cols is None else min(tile_cols, cols)
+    pixel_bytes = (N_INPUTS + N_OUTPUTS) * itemsize
+    kernel_row_bytes = N_KERNEL_BUFFERS * tile_cols * itemsize
+    tile_rows = (memory_limit - block_rows * kernel_row_bytes) // (pixel_bytes * tile_cols)
+    if tile_rows < block_rows:
+        # tiles thinner than a kernel block, the kernel buffers shrink with the tile
+        tile_rows = memory_limit // (pixel_bytes * tile_cols + kernel_row_bytes)
+    if tile_rows < 1:
+        raise ValueError('memory_limit of ' + str(memory_limit) + ' bytes is too small for tiles of ' + str(tile_cols) + ' columns')
+
+    return min(int(tile_rows), rows), tile_cols
+
+
+# row/column windows covering the grid, row-major
+def iter_tiles(grid_shape, tile_rows, tile_cols):
+    rows, cols = grid_shape
+    for row_start in range(0, rows, tile_rows):
+        for col_start in range(0, cols, tile_cols):
+            yield slice(row_start, min(row_start + tile_rows, rows)), slice(col_start, min(col_start + tile_cols, cols))
+
+
+# a source is either an array-like sliced as [rows, cols] (ndarray, numpy.memmap, numpy.load(..., mmap_mode='r'))
+# or a function reading the window: source(row_slice, col_slice)
+def read_tile(source, row_slice, col_slice):
+    if callable(source):
+        return np.asarray(source(row_slice, col_slice))
+    return np.asarray(source[row_slice, col_slice])
+
+
+def ptjpl_area_tiled(r_net_source, rh_source, ta_source, ndvi_source, grid_shape=None, out=None,
+                     tile_rows=None, tile_cols=None, memory_limit=DEFAULT_MEMORY_LIMIT, verbose=True,
+                     floor_saturation_vapor_pressure=DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE,
+                     optimum_temperature=DEFAULT_OPTIMUM_TEMPERATURE, block_rows=DEFAULT_BLOCK_ROWS, dtype='float64',
+                     jit=False):
+    """
+        Runs ptjpl_area over a grid that does not fit into memory (e.g. the 6000x6000 FD extent)
+        tile by tile. Only one tile of inputs and outputs is held at once.
+
+        fAPARmax is the only value of the model that depends on the whole grid, so it is found in a first
+        pass over the NDVI tiles; the second pass runs ptjpl_area_fused on each tile with that value.
+        The optimum temperature of the area model is a constant (no Topt_fun argmax), so the result
+        is the same as one ptjpl_area_fused run on the full arrays.
+
+        :param r_net_source, rh_source, ta_source, ndvi_source:
+            Array-likes indexed as [rows, cols] or functions source(row_slice, col_slice) returning the window
+        :param grid_shape:
+            (rows, cols) of the grid, taken from r_net_source when None
+        :param out:
+            (5, rows, cols) array-like receiving the results, e.g. numpy.lib.format.open_memmap(..., mode='w+');
+            allocated in memory when None
+        :param tile_rows, tile_cols:
+            Tile size; tile_rows is derived from memory_limit when None, tile_cols defaults to full rows
+        :param memory_limit:
+            Memory ceiling in bytes for one tile (inputs, outputs and kernel buffers)
+        :param dtype:
+            'float64' or 'float32' calculation and results; float32 fits tiles twice as large into memory_limit
+        :param jit:
+            Run the tiles with ptjpl_area_jit (numba, all cores, no kernel buffers) instead of ptjpl_area_fused
+
+        :return:
+            out with evapotranspiration, canopy_transpiration, interception_evaporation,
+            soil_evaporation, potential_evapotranspiration
+        """
+    if grid_shape is None:
+        grid_shape = np.shape(r_net_source)
+    rows, cols = grid_shape
+    if tile_rows is None:
+        # the numba kernel has no block buffers
+        tile_rows, tile_cols = tile_shape_for_memory(grid_shape, memory_limit, tile_cols, 0 if jit else block_rows,
+                                                     np.dtype(dtype).itemsize)
+    elif tile_cols is None:
+        tile_cols = cols
+    if out is None:
+        out = np.empty((N_OUTPUTS, rows, cols), dtype=dtype)
+
+    if verbose:
+        print('calculating maximum fAPAR')
+    fAPARmax = np.nan
+    for row_slice, col_slice in iter_tiles(grid_shape, tile_rows, tile_cols):
+        ndvi = read_tile(ndvi_source, row_slice, col_slice)
+        fAPARmax = np.fmax(fAPARmax, fAPARmax_from_ndvi(ndvi, block_rows))
+
+    tiles = list(iter_tiles(grid_shape, tile_rows, tile_cols))
+    out_tile = np.empty((N_OUTPUTS, tile_rows, tile_cols), dtype=dtype)
+    for i, (row_slice, col_slice) in enumerate(tiles):
+        if verbose:
+            print('tile ' + str(i+1) + '/' + str(len(tiles)) + ': rows ' + str(row_slice.start) + '-' + str(row_slice.stop)
+                  + ', cols ' + str(col_slice.start) + '-' + str(col_slice.stop))
+        r_net = read_tile(r_net_source, row_slice, col_slice)
+        rh = read_tile(rh_source, row_slice, col_slice)
+        ta = read_tile(ta_source, row_slice, col_slice)
+        ndvi = read_tile(ndvi_source, row_slice, col_slice)
+        tile_out = out_tile[:, :r_net.shape[0], :r_net.shape[1]]
+        if jit:
+            ptjpl_area_jit(r_net, rh, ta, ndvi, out=tile_out, floor_saturation_vapor_pressure=floor_saturation_vapor_pressure,
+                           optimum_temperature=optimum_temperature, fAPARmax=fAPARmax, dtype=dtype)
+        else:
+            ptjpl_area_fused(r_net, rh, ta, ndvi, out=tile_out, floor_saturation_vapor_pressure=floor_saturation_vapor_pressure,
+                             optimum_temperature=optimum_temperature, fAPARmax=fAPARmax, block_rows=block_rows, dtype=dtype)
+        out[:, row_slice, col_slice] = tile_out
+
+    return out
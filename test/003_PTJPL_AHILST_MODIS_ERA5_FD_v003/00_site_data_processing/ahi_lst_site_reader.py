@@ -0,0 +1,55 @@
+import os
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+pixel_size = 0.02 # 0.02°
+# FD 180 extent
+lst_extent = (85.0, 180.0, -60, 60) # l_lon, r_lon, b_lat, t_lat
+LST_SHAPE = (6000, 6000)
+LST_NODATA = -999
+DEFAULT_WORKERS = 8
+
+
+# flat pixel index of every site in an AHI LST frame (same row/column rounding as read_AHILST_data)
+def site_pixel_indices(site_infos, extent=lst_extent, pixel_size=pixel_size, shape=LST_SHAPE):
+    site_lat_idx = numpy.array([int((extent[3] - site_info[1])/pixel_size) for site_info in site_infos])
+    site_lon_idx = numpy.array([int((site_info[2] - extent[0])/pixel_size) for site_info in site_infos])
+    if site_lat_idx.min() < 0 or site_lat_idx.max() >= shape[0] or site_lon_idx.min() < 0 or site_lon_idx.max() >= shape[1]:
+        raise ValueError('site outside of the AHI LST extent')
+    return site_lat_idx * shape[1] + site_lon_idx
+
+
+# site values of one AHILST.v0 frame in ℃ as float64 (NaN for no data or missing/broken file);
+# only the rows up to the last site are decompressed
+def read_AHILST_sites(ahi_lst_gz, flat_indices, shape=LST_SHAPE):
+    nan_array = numpy.full(len(flat_indices), numpy.nan)
+    if not os.path.exists(ahi_lst_gz):
+        return nan_array
+    try:
+        last_row = int(numpy.max(flat_indices)) // shape[1]
+        n_bytes = (last_row + 1) * shape[1] * 4
+        with gzip.open(ahi_lst_gz, 'rb') as file:
+            gz_data = file.read(n_bytes)
+        if len(gz_data) < n_bytes:
+            raise ValueError('truncated file: ' + str(len(gz_data)) + ' of ' + str(n_bytes) + ' bytes')
+        site_vs = numpy.frombuffer(gz_data, dtype='f4')[flat_indices].astype(float)
+        site_vs[site_vs == LST_NODATA] = numpy.nan
+        return site_vs
+    except Exception as e:
+        print(ahi_lst_gz)
+        print(e)
+        return nan_array
+
+
+# site values of many frames, decompressed on a thread pool (zlib releases the GIL)
+# slot_mask (n_files,) bool: only these files are read, the others stay NaN (e.g. ptjpl_engine.solar_slots.any_daytime_mask)
+# returns (n_files, n_sites)
+def read_AHILST_sites_files(ahi_lst_gzs, flat_indices, workers=DEFAULT_WORKERS, shape=LST_SHAPE, slot_mask=None):
+    site_array = numpy.full((len(ahi_lst_gzs), len(flat_indices)), numpy.nan)
+    file_idx = numpy.arange(len(ahi_lst_gzs)) if slot_mask is None else numpy.flatnonzero(slot_mask)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, site_vs in zip(file_idx, executor.map(lambda i: read_AHILST_sites(ahi_lst_gzs[i], flat_indices, shape), file_idx)):
+            site_array[i] = site_vs
+    return site_array
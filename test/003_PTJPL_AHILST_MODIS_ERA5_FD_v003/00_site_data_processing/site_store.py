@@ -0,0 +1,97 @@
+import os
+
+import numpy
+
+TIME_FILENAME = 'time.npy'
+COLUMNS_FILENAME = 'columns.txt'
+SERIES_COLUMN = 'value' # column of single-variable series (<site>_AHI_LST, <site>_Rlu, ...)
+
+
+# A site table is a folder named like the CSV it replaces, without the extension:
+#   <folder>/<name>/time.npy       int64 seconds since 1970-01-01 of the time strings (site local time as written)
+#   <folder>/<name>/<column>.npy   float32, one file per column so each column is memory-mapped on its own
+#   <folder>/<name>/columns.txt    column names in their order
+# e.g. processing_record/CLC_AHI_LST.csv -> processing_record/CLC_AHI_LST/{time,value}.npy
+def site_table_folder(folder, name):
+    return os.path.join(folder, name)
+
+
+def site_table_exists(folder, name):
+    return os.path.exists(os.path.join(site_table_folder(folder, name), TIME_FILENAME))
+
+
+# '2018-07-19T03:00:00Z' strings -> int64 seconds
+def time_strings_to_epoch(time_strings):
+    time_strings = numpy.char.rstrip(numpy.asarray(time_strings, dtype=str), 'Z')
+    return time_strings.astype('datetime64[s]').astype(numpy.int64)
+
+
+# int64 seconds -> '2018-07-19T03:00:00Z' strings
+def epoch_to_time_strings(epoch):
+    time_strings = numpy.datetime_as_string(numpy.asarray(epoch, dtype=numpy.int64).astype('datetime64[s]'), unit='s')
+    return numpy.char.add(time_strings, 'Z').astype('U20')
+
+
+# times: time strings or int64 seconds; columns: {column: values}; csv: also write <folder>/<name>.csv
+def write_site_table(folder, name, times, columns, csv=False):
+    times = numpy.asarray(times)
+    epoch = times.astype(numpy.int64) if numpy.issubdtype(times.dtype, numpy.integer) else time_strings_to_epoch(times)
+    table_folder = site_table_folder(folder, name)
+    if not os.path.exists(table_folder):
+        os.makedirs(table_folder)
+    for column, values in columns.items():
+        values = numpy.asarray(values, dtype=numpy.float32)
+        if len(values) != len(epoch):
+            raise ValueError(column + ' has ' + str(len(values)) + ' values for ' + str(len(epoch)) + ' times')
+        numpy.save(os.path.join(table_folder, column + '.npy'), values)
+    with open(os.path.join(table_folder, COLUMNS_FILENAME), 'w') as file:
+        file.write('\n'.join(columns) + '\n')
+    # time last, a table without it is not complete
+    numpy.save(os.path.join(table_folder, TIME_FILENAME), epoch)
+    if csv:
+        export_site_csv(folder, name, list(columns))
+
+
+# int64 seconds and {column: float32 values} (memory-mapped unless mmap_mode is None)
+def read_site_table(folder, name, columns=None, mmap_mode='r'):
+    table_folder = site_table_folder(folder, name)
+    epoch = numpy.load(os.path.join(table_folder, TIME_FILENAME), mmap_mode=mmap_mode)
+    if columns is None:
+        with open(os.path.join(table_folder, COLUMNS_FILENAME)) as file:
+            columns = file.read().split()
+    return epoch, {column: numpy.load(os.path.join(table_folder, column + '.npy'), mmap_mode=mmap_mode) for column in columns}
+
+
+def write_site_series(folder, name, times, values, csv=False):
+    write_site_table(folder, name, times, {SERIES_COLUMN: values}, csv)
+
+
+def read_site_series(folder, name, mmap_mode='r'):
+    epoch, columns = read_site_table(folder, name, [SERIES_COLUMN], mmap_mode)
+    return epoch, columns[SERIES_COLUMN]
+
+
+# CSV of a site table as written before: [time string, str(value)] rows for a series,
+# a 'Time,<columns>' header line and one column per variable for tables
+def export_site_csv(folder, name, columns=None, csv_filename=None):
+    epoch, table = read_site_table(folder, name, columns)
+    if csv_filename is None:
+        csv_filename = os.path.join(folder, name + '.csv')
+    csv_columns = [epoch_to_time_strings(epoch)] + [numpy.asarray(values, dtype=float).astype(str) for values in table.values()]
+    csv_data = numpy.column_stack(csv_columns)
+    if list(table) != [SERIES_COLUMN]:
+        csv_data = numpy.vstack([['Time'] + list(table), csv_data])
+    numpy.savetxt(csv_filename, csv_data, delimiter=",", fmt='%s')
+    return csv_filename
+
+
+# time strings and float values of a <site>_<variable>.csv series, from the site table next to it when there is one
+def read_site_csv(csv_filename):
+    folder, name = os.path.split(os.path.splitext(csv_filename)[0])
+    if site_table_exists(folder, name):
+        epoch, values = read_site_series(folder, name)
+        return epoch_to_time_strings(epoch), numpy.asarray(values, dtype=float)
+    csv_data = numpy.genfromtxt(csv_filename, delimiter=',', dtype=str)
+    csv_v = csv_data[:, 1]
+    csv_v = csv_v.astype(float)
+    return csv_data[:, 0], csv_v
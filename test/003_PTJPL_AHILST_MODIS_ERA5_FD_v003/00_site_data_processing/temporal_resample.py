@@ -0,0 +1,76 @@
+import numpy
+
+time_internal = 10 # mins
+HOUR_STEPS = 60 // time_internal # 10-minute steps per hour
+UPSAMPLE_METHODS = ('linear', 'nearest', 'step')
+DOWNSAMPLE_METHODS = ('mean', 'first')
+
+
+# regular time axis as datetime64[s]: n times from start every `minutes`
+def time_axis(start, n, minutes=time_internal):
+    return numpy.datetime64(start, 's') + numpy.arange(n) * numpy.timedelta64(minutes * 60, 's')
+
+
+# regular time axis as datetime64[s] over [start, end), leap days included
+def time_range(start, end, minutes=time_internal):
+    return numpy.arange(numpy.datetime64(start, 's'), numpy.datetime64(end, 's'), numpy.timedelta64(minutes * 60, 's'))
+
+
+# every sample of array (along axis) becomes `factor` samples:
+#   'linear'  numpy.linspace(a[i], a[i+1], factor, endpoint=False) between neighbours, the last sample repeated
+#             (same values as the linear_interpolation_1h_10min loop)
+#   'nearest' the nearer of a[i] and a[i+1] (halfway goes to a[i]), the last sample repeated
+#   'step'    a[i] repeated (numpy.repeat)
+# works on (time,), (time, site) and (time, y, x) arrays
+def upsample(array, factor=HOUR_STEPS, method='linear', axis=0):
+    if method not in UPSAMPLE_METHODS:
+        raise ValueError('method must be one of ' + str(UPSAMPLE_METHODS) + ', got ' + str(method))
+    array = numpy.moveaxis(numpy.asarray(array, dtype=float), axis, 0)
+    if method == 'step':
+        return numpy.moveaxis(numpy.repeat(array, factor, axis=0), 0, axis)
+
+    n = len(array)
+    resampled = numpy.empty((n, factor) + array.shape[1:])
+    step_idx = numpy.arange(factor, dtype=float).reshape((1, factor) + (1,) * (array.ndim - 1))
+    if method == 'linear':
+        step = (array[1:] - array[:-1]) / factor
+        resampled[:-1] = step_idx * step[:, None]
+        resampled[:-1] += array[:-1, None]
+    else:
+        resampled[:-1] = numpy.where(step_idx * 2 > factor, array[1:, None], array[:-1, None])
+    resampled[-1] = array[-1]
+    return numpy.moveaxis(resampled.reshape((n * factor,) + array.shape[1:]), 0, axis)
+
+
+# every `factor` samples (along axis) become one: their NaN-ignoring 'mean' or the 'first' of them
+def downsample(array, factor=HOUR_STEPS, method='mean', axis=0):
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError('method must be one of ' + str(DOWNSAMPLE_METHODS) + ', got ' + str(method))
+    array = numpy.moveaxis(numpy.asarray(array, dtype=float), axis, 0)
+    if len(array) % factor:
+        raise ValueError(str(len(array)) + ' samples are not a multiple of ' + str(factor))
+    if method == 'first':
+        return numpy.moveaxis(array[::factor], 0, axis)
+    blocks = array.reshape((len(array) // factor, factor) + array.shape[1:])
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        block_mean = numpy.nansum(blocks, axis=1) / numpy.sum(~numpy.isnan(blocks), axis=1)
+    return numpy.moveaxis(block_mean, 0, axis)
+
+
+# start days of the MODIS n-day composites (DOY 1, 1+n, ...) of every year, as datetime64[D]
+def composite_start_days(years, composite_days=16):
+    starts = [numpy.datetime64(str(year) + '-01-01') + numpy.arange(0, 365, composite_days) for year in years]
+    return numpy.concatenate(starts)
+
+
+# value of the latest composite started at or before every time (times before the first take the first);
+# composites end where the next one starts, so the last one of a year runs to Dec 31 (13 or 14 days)
+def composites_to_time_axis(values, composite_starts, times, axis=0):
+    starts = numpy.asarray(composite_starts, dtype='datetime64[s]')
+    composite_idx = numpy.searchsorted(starts, numpy.asarray(times, dtype='datetime64[s]'), side='right') - 1
+    return numpy.take(numpy.asarray(values, dtype=float), composite_idx.clip(0), axis=axis)
+
+
+# mask of the times within the local period [local_start, local_end)
+def period_mask(times, local_start, local_end):
+    return (times >= numpy.datetime64(local_start, 's')) & (times < numpy.datetime64(local_end, 's'))
@@ -0,0 +1,109 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# site_store is the module of 00_site_data_processing, which writes the site tables
+SITE_PROCESSING_FOLDER = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                      '00_site_data_processing'))
+if SITE_PROCESSING_FOLDER not in sys.path:
+    sys.path.insert(0, SITE_PROCESSING_FOLDER)
+
+from ptjpl_fd import ptjpl_arrays, DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE
+from site_store import site_table_exists, read_site_table, epoch_to_time_strings
+from ptjpl_engine.solar_slots import site_daytime_mask
+
+INPUT_SUFFIX = '_PL-JPL_inputs.csv'
+OUTPUT_SUFFIX = '_PL-JPL_outputs.csv'
+CUBE_OUTPUT_FILENAME = 'PL-JPL_outputs.npz'
+INPUT_COLUMNS = ['NETRAD', 'TA', 'Td', 'NDVI']
+DEFAULT_WORKERS = 8
+
+
+# inputs of one site as the dataframe ptjpl takes (float64 columns, indexed by Time),
+# from the <site>_PL-JPL_inputs site table when there is one, from the CSV otherwise
+def read_site_frame(data_path, site_name, input_suffix=INPUT_SUFFIX):
+    table_name = site_name + os.path.splitext(input_suffix)[0]
+    if site_table_exists(data_path, table_name):
+        epoch, columns = read_site_table(data_path, table_name, INPUT_COLUMNS)
+        site_df = pd.DataFrame({column: np.asarray(columns[column], dtype=float) for column in INPUT_COLUMNS},
+                               index=pd.Index(epoch_to_time_strings(epoch), name='Time'))
+        return site_df
+    return pd.read_csv(os.path.join(data_path, site_name + input_suffix), usecols=['Time'] + INPUT_COLUMNS).set_index('Time')
+
+
+# inputs of all sites as one (site, time) cube, each site from its first row and padded with NaN at the end
+# returns site times ((site, time) str, '' for padding), {column: (site, time)} and the number of rows of every site
+def read_site_cube(data_path, site_names, input_suffix=INPUT_SUFFIX, workers=DEFAULT_WORKERS):
+    def read_site(site_name):
+        return read_site_frame(data_path, site_name, input_suffix).reset_index()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        site_dfs = list(executor.map(read_site, site_names))
+    lengths = np.array([len(site_df) for site_df in site_dfs])
+    n_time = int(lengths.max())
+
+    times = np.full((len(site_names), n_time), '', dtype=object)
+    cube = {column: np.full((len(site_names), n_time), np.nan) for column in INPUT_COLUMNS}
+    for i, site_df in enumerate(site_dfs):
+        times[i, :lengths[i]] = site_df['Time'].astype(str).values
+        for column in INPUT_COLUMNS:
+            cube[column][i, :lengths[i]] = site_df[column].values
+    return times.astype(str), cube, lengths
+
+
+# ptjpl on a (site, time) cube: every step is evaluated for all sites at once, fAPARmax and Topt per site;
+# slot_mask (site, time) limits the evaluation to some slots (e.g. daytime_slot_mask), the others are NaN
+def run_site_cube(cube, lengths, verbose=True, floor_saturation_vapor_pressure=DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE,
+                  slot_mask=None):
+    return ptjpl_arrays(cube['TA'], cube['NDVI'], cube['NETRAD'], cube['Td'], lengths=lengths, verbose=verbose,
+                        floor_saturation_vapor_pressure=floor_saturation_vapor_pressure, slot_mask=slot_mask)
+
+
+# (site, time) daytime slots of a cube from the site local times ('' padding is night);
+# site_infos rows are [site, lat, lon, UTC+] in the order of the cube
+def daytime_slot_mask(site_infos, times):
+    times = np.char.rstrip(np.asarray(times, dtype=str), 'Z')
+    local_times = np.where(times == '', 'NaT', times).astype('datetime64[s]')
+    return site_daytime_mask(site_infos, local_times)
+
+
+# all sites in one file: one (site, time) array per column, plus site, Time and length
+def save_site_outputs(output_filename, site_names, times, lengths, outputs):
+    np.savez(output_filename, site=np.array(site_names), Time=times, length=lengths, **outputs)
+
+
+def load_site_outputs(output_filename):
+    with np.load(output_filename) as npz:
+        return {key: npz[key] for key in npz.files}
+
+
+# one site of a cube (inputs or outputs) as the dataframe ptjpl returns for it, indexed by Time
+def site_frame(site_outputs, site_idx, columns=None):
+    length = int(site_outputs['length'][site_idx])
+    if columns is None:
+        columns = [key for key in site_outputs if key not in ('site', 'Time', 'length')]
+    site_df = pd.DataFrame({column: site_outputs[column][site_idx, :length] for column in columns},
+                           index=pd.Index(site_outputs['Time'][site_idx, :length], name='Time'))
+    return site_df
+
+
+# read, run and write all sites at once; write_csv additionally writes the per-site <site>_PL-JPL_outputs.csv
+# (input and output columns, as the single-site ptjpl loop did).
+# daytime_site_infos ([site, lat, lon, UTC+] rows of site_names): only evaluate the daytime slots
+def run_sites(data_path, site_names, output_filename=None, write_csv=False, verbose=True, daytime_site_infos=None):
+    times, cube, lengths = read_site_cube(data_path, site_names)
+    slot_mask = daytime_slot_mask(daytime_site_infos, times) if daytime_site_infos is not None else None
+    outputs = run_site_cube(cube, lengths, verbose=verbose, slot_mask=slot_mask)
+    if output_filename is None:
+        output_filename = os.path.join(data_path, CUBE_OUTPUT_FILENAME)
+    save_site_outputs(output_filename, site_names, times, lengths, outputs)
+    if write_csv:
+        site_outputs = dict(site=np.array(site_names), Time=times, length=lengths, **cube)
+        site_outputs.update(outputs)
+        for i, site_name in enumerate(site_names):
+            site_df = site_frame(site_outputs, i, INPUT_COLUMNS + list(outputs))
+            site_df.to_csv(os.path.join(data_path, site_name + OUTPUT_SUFFIX), index=True)
+    return output_filename
@@ -0,0 +1,54 @@
+import numpy
+from scipy.ndimage import gaussian_filter
+from scipy.stats import gaussian_kde
+
+DENSITY_METHODS = ('hist', 'kde')
+DEFAULT_BINS = 256 # histogram bins per axis
+DEFAULT_MAX_POINTS = 200000 # points drawn by the scatter, the densities still come from all points
+
+
+# Gaussian KDE of the points evaluated at the points, binned: a 2-D histogram smoothed by a Gaussian
+# with Scott's bandwidth of each axis (as gaussian_kde, without the cross term), read at the bin of each point.
+# O(N + bins²) instead of the O(N²) of gaussian_kde(xy)(xy); densities are relative (for colouring only)
+def binned_density(x, y, bins=DEFAULT_BINS):
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    hist, x_edges, y_edges = numpy.histogram2d(x, y, bins)
+    scott = len(x) ** (-1. / 6)
+    sigma = [scott * numpy.std(v) / (edges[1] - edges[0]) if edges[1] > edges[0] else 0.
+             for v, edges in [(x, x_edges), (y, y_edges)]]
+    density = gaussian_filter(hist, sigma, mode='constant')
+    x_idx = numpy.clip(numpy.searchsorted(x_edges, x, side='right') - 1, 0, bins - 1)
+    y_idx = numpy.clip(numpy.searchsorted(y_edges, y, side='right') - 1, 0, bins - 1)
+    return density[x_idx, y_idx]
+
+
+def point_density(x, y, method='hist', bins=DEFAULT_BINS):
+    """
+        Density at every (x, y) point to colour a scatter plot.
+
+        :param method: 'hist' binned KDE (binned_density, seconds for millions of points),
+                       'kde' scipy gaussian_kde (exact, minutes for ~100k points)
+        """
+    if method not in DENSITY_METHODS:
+        raise ValueError('method must be one of ' + str(DENSITY_METHODS) + ', got ' + str(method))
+    if method == 'kde':
+        xy = numpy.vstack([x, y])
+        return gaussian_kde(xy)(xy)
+    return binned_density(x, y, bins)
+
+
+# (x, y, density scaled to 0-100) of the points to draw, densest drawn last; at most max_points of them
+# (a fixed random subset, so reruns give the same figure)
+def density_scatter_points(x, y, method='hist', bins=DEFAULT_BINS, max_points=DEFAULT_MAX_POINTS):
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    z = point_density(x, y, method, bins)
+    if max_points is not None and len(x) > max_points:
+        keep = numpy.random.default_rng(0).choice(len(x), max_points, replace=False)
+        x, y, z = x[keep], y[keep], z[keep]
+    idx = z.argsort()
+    x, y, z = x[idx], y[idx], z[idx]
+    z_range = numpy.max(z) - numpy.min(z)
+    z = (z - numpy.min(z)) / z_range * 100 if z_range > 0 else numpy.full(len(z), 100.)
+    return x, y, z
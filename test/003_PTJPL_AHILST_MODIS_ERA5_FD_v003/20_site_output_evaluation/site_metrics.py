@@ -0,0 +1,120 @@
+import numpy
+import pandas as pd
+from scipy.stats import kendalltau
+
+time_internal = 10 # mins
+# aggregation name : 10-minute steps per block (NaN-ignoring mean)
+AGGREGATIONS = {
+    '10min': 1,
+    '30min': 30 // time_internal,
+    'hourly': 60 // time_internal,
+    'daily': 24 * 60 // time_internal,
+}
+METRIC_NAMES = ('N', 'R2', 'RMSE', 'Bias', 'MAE', 'Slope', 'Intercept', 'KGE', 'Tau')
+
+
+# every `factor` samples along the last axis become their NaN-ignoring mean (NaN when all are NaN)
+def block_mean(array, factor):
+    array = numpy.asarray(array, dtype=float)
+    if factor == 1:
+        return array
+    if array.shape[-1] % factor:
+        raise ValueError(str(array.shape[-1]) + ' samples are not a multiple of ' + str(factor))
+    blocks = array.reshape(array.shape[:-1] + (array.shape[-1] // factor, factor))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return numpy.nansum(blocks, axis=-1) / numpy.sum(~numpy.isnan(blocks), axis=-1)
+
+
+# Kendall's tau-b of every series (last axis) over the samples where mask is true
+def masked_kendall(sim, obs, mask):
+    tau = numpy.full(mask.shape[:-1], numpy.nan)
+    for idx in numpy.ndindex(*mask.shape[:-1]):
+        if numpy.count_nonzero(mask[idx]) > 1:
+            tau[idx] = kendalltau(sim[idx][mask[idx]], obs[idx][mask[idx]])[0]
+    return tau
+
+
+def masked_metrics(sim, obs, kendall=True):
+    """
+        Metrics of simulated against observed series, only over the samples where both are not NaN.
+        All series of the leading axes (e.g. version, site) are done together from one set of masked sums.
+
+        :param sim: simulated, (..., time)
+        :param obs: observed, same shape as sim
+        :param kendall: also Kendall's tau (one scipy call per series, the slowest metric)
+        :return:
+            {metric name: (...) array}, see METRIC_NAMES. R2 is the squared Pearson r, Slope and Intercept
+            the least squares line sim = Slope*obs + Intercept, Bias mean(sim - obs), KGE the Kling-Gupta efficiency;
+            NaN for series with fewer than 2 valid pairs
+        """
+    sim = numpy.asarray(sim, dtype=float)
+    obs = numpy.asarray(obs, dtype=float)
+    mask = ~(numpy.isnan(sim) | numpy.isnan(obs))
+    n = numpy.count_nonzero(mask, axis=-1)
+    s = numpy.where(mask, sim, 0.)
+    o = numpy.where(mask, obs, 0.)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        s_mean = s.sum(axis=-1) / n
+        o_mean = o.sum(axis=-1) / n
+        # centred sums, steadier than the raw sums for large means (e.g. W/m2)
+        s_c = numpy.where(mask, s - s_mean[..., None], 0.)
+        o_c = numpy.where(mask, o - o_mean[..., None], 0.)
+        s_var = (s_c * s_c).sum(axis=-1) / n
+        o_var = (o_c * o_c).sum(axis=-1) / n
+        cov = (s_c * o_c).sum(axis=-1) / n
+        diff = s - o
+        r = cov / numpy.sqrt(s_var * o_var)
+        slope = cov / o_var
+        metrics = {
+            'N': n,
+            'R2': r ** 2,
+            'RMSE': numpy.sqrt((diff * diff).sum(axis=-1) / n),
+            'Bias': diff.sum(axis=-1) / n,
+            'MAE': numpy.abs(diff).sum(axis=-1) / n,
+            'Slope': slope,
+            'Intercept': s_mean - slope * o_mean,
+            'KGE': 1 - numpy.sqrt((r - 1) ** 2 + (s_mean / o_mean - 1) ** 2 + (numpy.sqrt(s_var / o_var) - 1) ** 2),
+        }
+    few = n < 2
+    for name in METRIC_NAMES[1:-1]:
+        metrics[name] = numpy.where(few, numpy.nan, metrics[name])
+    metrics['Tau'] = masked_kendall(sim, obs, mask) if kendall else numpy.full(n.shape, numpy.nan)
+    return metrics
+
+
+def evaluate_sites(sims, obs, site_names, aggregations=AGGREGATIONS, all_sites=True, kendall=True):
+    """
+        Metrics table of several model versions at all sites and aggregations.
+        The observations are aggregated once and every version and site of an aggregation is done in one pass.
+
+        :param sims: {version: (site, time) 10-minute simulated array}, or a single (site, time) array
+        :param obs: (site, time) 10-minute observed array, time a multiple of the largest aggregation
+        :param aggregations: {name: 10-minute steps per block}
+        :param all_sites: also the pooled samples of all sites, as site 'All'
+        :return:
+            pandas.DataFrame indexed by (version, aggregation, site) with the METRIC_NAMES columns
+        """
+    if not isinstance(sims, dict):
+        sims = {'': sims}
+    versions = list(sims)
+    site_names = list(site_names)
+    sim_stack = numpy.stack([numpy.asarray(sims[version], dtype=float) for version in versions])
+    obs = numpy.asarray(obs, dtype=float)
+
+    agg_metrics = {}
+    for agg_name, factor in aggregations.items():
+        agg_sim = block_mean(sim_stack, factor)
+        agg_obs = numpy.broadcast_to(block_mean(obs, factor), agg_sim.shape)
+        metrics = masked_metrics(agg_sim, agg_obs, kendall)
+        if all_sites:
+            pooled = masked_metrics(agg_sim.reshape(len(versions), 1, -1), agg_obs.reshape(len(versions), 1, -1), kendall)
+            metrics = {name: numpy.concatenate([metrics[name], pooled[name]], axis=1) for name in METRIC_NAMES}
+        agg_metrics[agg_name] = metrics
+
+    names = site_names + ['All'] if all_sites else site_names
+    index = pd.MultiIndex.from_product([versions, list(aggregations), names], names=['version', 'aggregation', 'site'])
+    # (version, aggregation, site) rows in the order of the index
+    columns = {name: numpy.stack([agg_metrics[agg_name][name] for agg_name in aggregations], axis=1).ravel()
+               for name in METRIC_NAMES}
+    return pd.DataFrame(columns, index=index)
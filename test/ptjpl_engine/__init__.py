@@ -0,0 +1,26 @@
+"""
+    PT-JPL engine shared by the site and area runs of all versions.
+
+    config: PTJPLConfig, the variants the model copies differed in, and the presets of each version
+    core:   ptjpl_arrays, the model on ndarrays
+    site:   ptjpl, the dataframe front end of one site
+    area:   ptjpl_area / ptjpl_area_fused, the grid front ends
+    topt:   the streamed optimum temperature (Topt_fun without the rolling means)
+    precision: compare_precision / check_float32, the float32 grid runs against float64
+    jit:    ptjpl_area_jit, the numba kernel of the grid front end (optional, NUMBA_AVAILABLE)
+    daily:  DailyET, the daily maps (means, evaporative fraction, daily ET) folded in step by step
+    solar_slots: the daytime 10-minute slots of sites and grids (solar zenith), the night slots readers and runs skip
+    """
+from .config import (PTJPLConfig, SVP_CONSTANTS, DTYPES, FD_CONFIG, ECOSTRESS_CONFIG, ECOSTRESS_30MIN_CONFIG, AREA_CONFIG,
+                     AREA_FLOAT32_CONFIG, GITHUB_CONFIG, GITHUB_CLIP_CONFIG, AMATERASS_CONFIG,
+                     DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE, DEFAULT_OPTIMUM_TEMPERATURE)
+from .core import ptjpl_arrays, site_column, RESULT_COLUMNS
+from .site import ptjpl
+from .area import (ptjpl_area, ptjpl_area_fused, fAPARmax_from_ndvi, soil_heat_flux_from_ndvi, AREA_OUTPUTS,
+                   DEFAULT_BLOCK_ROWS)
+from .topt import StreamingTopt, streaming_topt, site_topt, trailing_means
+from .precision import compare_precision, check_float32, FLOAT32_LE_TOLERANCE
+from .jit import ptjpl_area_jit, NUMBA_AVAILABLE
+from .daily import DailyET, LE_2_ETmm
+from .solar_slots import (solar_zenith, sunrise_sunset, daytime_mask, site_daytime_mask, any_daytime_mask,
+                          grid_daytime_mask, daytime_slot_filter, extent_points)
@@ -0,0 +1,323 @@
+import numpy as np
+
+from .config import AREA_CONFIG, SVP_CONSTANTS
+from .core import ptjpl_arrays, PRIESTLEY_TAYLOR_ALPHA, PSYCHROMETRIC_GAMMA, KRN, KPAR
+
+DEFAULT_BLOCK_ROWS = 64 # rows of the grid processed per block by the fused kernel
+# the (5, rows, cols) results of the grid front end
+AREA_OUTPUTS = ['evapotranspiration', 'canopy_transpiration', 'interception_evaporation', 'soil_evaporation',
+                'potential_evapotranspiration']
+
+
+def ptjpl_area(r_net_input_array,
+               humidity_input_array,
+               ta_input_array,
+               ndvi_input_array, verbose=True, floor_saturation_vapor_pressure=None,
+               fused=False, out=None, config=AREA_CONFIG, dtype=None, jit=False):
+    """
+        PT-JPL on one time step of a grid: ptjpl_arrays with the fAPARmax of the whole grid and the
+        constant config.optimum_temperature.
+
+        :param r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array:
+            (rows, cols) NETRAD (W/m2), RH (%) or Td (K) as config.humidity, TA (K) and NDVI (0-1.0)
+        :param verbose:
+            Flag to output activity to console
+        :param floor_saturation_vapor_pressure:
+            Option to floor calculation of saturation vapor pressure at 1 to avoid anomalous output
+            (config.floor_saturation_vapor_pressure when None)
+        :param fused:
+            Run the single-pass kernel (ptjpl_area_fused) instead of the full-grid calculation
+        :param out:
+            Optional (5, rows, cols) buffer the fused kernel writes the results into
+        :param config:
+            PTJPLConfig of the model variant
+        :param dtype:
+            'float32' or 'float64' type of the calculation and the results (config.dtype when None);
+            float32 always runs the fused kernel, the numpy.ma steps of ptjpl_arrays would promote it to float64
+        :param jit:
+            Run the numba kernel (jit.ptjpl_area_jit, all cores) instead
+
+        :return:
+            (5, rows, cols) array of the AREA_OUTPUTS: evapotranspiration, canopy_transpiration,
+            interception_evaporation, soil_evaporation, potential_evapotranspiration
+        """
+    if floor_saturation_vapor_pressure is not None:
+        config = config.replace(floor_saturation_vapor_pressure=floor_saturation_vapor_pressure)
+    if dtype is not None:
+        config = config.replace(dtype=dtype)
+    if jit:
+        from .jit import ptjpl_area_jit
+        return ptjpl_area_jit(r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array,
+                              out=out, verbose=verbose, config=config)
+    if fused or out is not None or config.dtype == 'float32':
+        return ptjpl_area_fused(r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array,
+                                out=out, verbose=verbose, config=config)
+
+    results = ptjpl_arrays(ta_input_array, ndvi_input_array, r_net_input_array, humidity_input_array, config,
+                           verbose=verbose, fAPARmax=fAPARmax_from_ndvi(ndvi_input_array),
+                           optimum_temperature=config.optimum_temperature)
+    return np.array([results[name] for name in AREA_OUTPUTS])
+
+
+# maximum fAPAR of the whole grid, the only non per-pixel value of the model
+# (fAPAR is bounded to 0-1 as in ptjpl_arrays)
+def fAPARmax_from_ndvi(ndvi_input_array, block_rows=DEFAULT_BLOCK_ROWS):
+    fAPARmax = np.nan
+    rows = ndvi_input_array.shape[0]
+    buffer = np.empty((min(block_rows, rows),) + ndvi_input_array.shape[1:])
+    for row_start in range(0, rows, block_rows):
+        ndvi = ndvi_input_array[row_start:row_start+block_rows]
+        fAPAR = buffer[:ndvi.shape[0]]
+        np.multiply(ndvi, 0.45, out=fAPAR)
+        fAPAR += 0.132
+        fAPAR *= 1.3632
+        fAPAR += -0.048
+        valid = fAPAR[(fAPAR >= 0.) & (fAPAR <= 1.)]
+        if valid.size:
+            fAPARmax = np.fmax(fAPARmax, valid.max())
+
+    return fAPARmax
+
+
+# soil heat flux (W/m2) of the grid from net radiation and NDVI, the operations of ptjpl_area_fused
+# (for the available energy Rn - G of the evaporative fraction, G is not one of the AREA_OUTPUTS)
+def soil_heat_flux_from_ndvi(r_net_input_array, ndvi_input_array, dtype=float):
+    net_radiation = np.asarray(r_net_input_array, dtype=dtype)
+    fIPAR = np.asarray(ndvi_input_array, dtype=dtype) + -0.05
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        soil_net_radiation = np.exp(-np.log(1 - fIPAR) * (1 / KPAR) * -KRN) * net_radiation
+        fIPAR[(fIPAR < 0) | (fIPAR > 1)] = np.nan
+        soil_heat_flux = ((1 - fIPAR) * 0.265 + 0.05) * net_radiation
+        soil_heat_flux[soil_heat_flux < 0] = 0
+        np.copyto(soil_heat_flux, soil_net_radiation * 0.35, where=soil_heat_flux > soil_net_radiation * 0.35)
+
+    return soil_heat_flux
+
+
+def ptjpl_area_fused(r_net_input_array,
+                     humidity_input_array,
+                     ta_input_array,
+                     ndvi_input_array, out=None, verbose=False, floor_saturation_vapor_pressure=None,
+                     optimum_temperature=None, fAPARmax=None, block_rows=DEFAULT_BLOCK_ROWS, config=AREA_CONFIG,
+                     dtype=None):
+    """
+        Single-pass version of ptjpl_area: the grid is walked once in blocks of rows and every
+        intermediate lives in a small set of block-sized buffers, so no full-grid temporaries are allocated.
+        The operations are the ones of ptjpl_arrays in the same order, so every pixel that ptjpl_area returns
+        comes out bit-identical, for every config variant. Pixels that numpy.ma masks in ptjpl_arrays (missing Ta
+        or NDVI, NDVI >= 1.05) are NaN in both, canopy_transpiration included; at NDVI of exactly 1.05 the
+        soil heat flux of ptjpl_arrays is bounded with masked values, so potential_evapotranspiration differs there.
+
+        :param out:
+            Optional (5, rows, cols) buffer for the results, allocated when None
+        :param optimum_temperature:
+            Topt (C), config.optimum_temperature when None
+        :param fAPARmax:
+            Maximum fAPAR of the grid, computed from ndvi_input_array when None
+        :param block_rows:
+            Number of rows processed at once
+        :param dtype:
+            'float32' or 'float64' type of the block buffers and of out when it is allocated (config.dtype when None);
+            the input blocks are cast to it
+
+        :return:
+            out with evapotranspiration, canopy_transpiration, interception_evaporation,
+            soil_evaporation, potential_evapotranspiration
+        """
+    config.check_grid_kernel()
+    if floor_saturation_vapor_pressure is None:
+        floor_saturation_vapor_pressure = config.floor_saturation_vapor_pressure
+    if optimum_temperature is None:
+        optimum_temperature = config.optimum_temperature
+    dtype = np.dtype(config.dtype if dtype is None else dtype)
+    svp_base, svp_mult, svp_add = SVP_CONSTANTS[config.svp]
+    rh_lower, rh_upper = (0., 1.) if config.rh_bounds == 'clip' else (np.nan, np.nan)
+    negative_vpd = np.nan if config.negative_vpd == 'nan' else 0
+
+    rows, cols = np.shape(r_net_input_array)
+    if out is None:
+        out = np.empty((5, rows, cols), dtype=dtype)
+    if out.shape != (5, rows, cols):
+        raise ValueError('out must have shape ' + str((5, rows, cols)) + ', got ' + str(out.shape))
+
+    if fAPARmax is None:
+        if verbose:
+            print('calculating maximum fAPAR')
+        fAPARmax = fAPARmax_from_ndvi(ndvi_input_array, block_rows)
+    # numpy scalars of another type would promote the blocks
+    fAPARmax, optimum_temperature = dtype.type(fAPARmax), dtype.type(optimum_temperature)
+
+    if verbose:
+        print('calculating evapotranspiration in blocks of ' + str(block_rows) + ' rows')
+
+    block_shape = (min(block_rows, rows), cols)
+    (air_temperature, saturation_vapor_pressure, relative_humidity, relative_surface_wetness, epsilon,
+     soil_factor, canopy_factor, fAPAR, fIPAR, green_canopy_fraction, plant_temperature_constraint,
+     soil_net_radiation, soil_heat_flux, temp) = [np.empty(block_shape, dtype=dtype) for i in range(14)]
+    condition, unmasked, soil_unmasked = [np.empty(block_shape, dtype=bool) for i in range(3)]
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for row_start in range(0, rows, block_rows):
+            row_end = min(row_start + block_rows, rows)
+            net_radiation, humidity, ta, ndvi = [np.asarray(values[row_start:row_end], dtype=dtype) for values in
+                                                 (r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array)]
+            block = slice(0, row_end - row_start)
+            Ta, svp, RH, rsw, eps = (air_temperature[block], saturation_vapor_pressure[block], relative_humidity[block],
+                                     relative_surface_wetness[block], epsilon[block])
+            ks, kc, fapar, fipar, fg, fT = (soil_factor[block], canopy_factor[block], fAPAR[block], fIPAR[block],
+                                            green_canopy_fraction[block], plant_temperature_constraint[block])
+            rns, G, t, c = soil_net_radiation[block], soil_heat_flux[block], temp[block], condition[block]
+            # pixels numpy.ma does not mask in ptjpl_arrays (non-finite results of its divisions, powers and log),
+            # for LEc and LEi and, with the soil moisture constraint, for LEs
+            m, ms = unmasked[block], soil_unmasked[block]
+            LE, LEc, LEi, LEs, PET = out[:, row_start:row_end]
+
+            # air temperature in celsius
+            np.subtract(ta, 273.15, out=Ta)
+
+            # saturation vapor pressure [kPa] and epsilon = delta / (delta + gamma)
+            np.multiply(Ta, svp_mult, out=svp)
+            np.add(Ta, svp_add, out=t)
+            svp /= t
+            np.exp(svp, out=svp)
+            if config.svp == 'tetens':
+                np.multiply(svp, 0.6108, out=eps)
+                eps *= 4098
+                svp *= svp_base
+                np.add(Ta, 237.3, out=t)
+            else:
+                svp *= svp_base
+                np.multiply(svp, 240.97*17.502, out=eps)
+            np.square(t, out=t)
+            eps /= t
+            np.add(eps, PSYCHROMETRIC_GAMMA, out=t)
+            eps /= t
+
+            # relative humidity, vapor pressure deficit (in svp) and relative surface wetness
+            if config.humidity == 'dew_point':
+                # water vapor pressure of the dew point in t
+                np.subtract(humidity, 273.15, out=t)
+                np.add(t, 237.3, out=RH)
+                t *= 17.502
+                t /= RH
+                np.exp(t, out=t)
+                t *= 0.613753
+                np.divide(t, svp, out=RH)
+                np.isfinite(RH, out=ms)
+            else:
+                np.divide(humidity, 100., out=RH)
+                ms.fill(True)
+            np.copyto(RH, rh_lower, where=np.less(RH, 0., out=c))
+            np.copyto(RH, rh_upper, where=np.greater(RH, 1., out=c))
+            if floor_saturation_vapor_pressure:
+                np.copyto(svp, 1, where=np.less(svp, 1, out=c))
+            if config.humidity != 'dew_point':
+                np.multiply(RH, svp, out=t)
+            svp -= t
+            np.copyto(svp, negative_vpd, where=np.less(svp, 0, out=c))
+            np.power(RH, 4, out=rsw)
+            if config.humidity == 'dew_point':
+                np.logical_and(ms, np.isfinite(rsw, out=c), out=m)
+            else:
+                m.fill(True)
+            np.copyto(rsw, 0., where=np.less_equal(Ta, 0, out=c))
+            np.logical_or(m, c, out=m)
+            np.logical_and(m, np.isfinite(eps, out=c), out=m)
+
+            # soil moisture constraint, then (rsw + fSM * (1 - rsw)) for soil evaporation
+            np.power(RH, svp, out=ks)
+            if config.humidity == 'dew_point':
+                np.logical_and(ms, np.isfinite(ks, out=c), out=ms)
+            np.copyto(ks, np.nan, where=np.less(ks, 0, out=c))
+            np.copyto(ks, np.nan, where=np.greater(ks, 1, out=c))
+            np.copyto(ks, 0.00, where=np.less(Ta, 0, out=c))
+            np.logical_or(ms, c, out=ms)
+            np.subtract(1, rsw, out=kc)
+            ks *= kc
+            ks += rsw
+
+            # vegetation values: fAPAR, fIPAR, green canopy fraction and plant moisture constraint
+            np.multiply(ndvi, 0.45, out=fapar)
+            fapar += 0.132
+            fapar *= 1.3632
+            fapar += -0.048
+            np.copyto(fapar, np.nan, where=np.less(fapar, 0., out=c))
+            np.copyto(fapar, np.nan, where=np.greater(fapar, 1., out=c))
+            np.add(ndvi, -0.05, out=fipar)
+            np.divide(fapar, fipar, out=fg)
+            np.copyto(fg, np.nan, where=np.less(fg, 0, out=c))
+            np.copyto(fg, np.nan, where=np.greater(fg, 1, out=c))
+            fapar /= fAPARmax
+            np.copyto(fapar, np.nan, where=np.less(fapar, 0, out=c))
+            np.copyto(fapar, np.nan, where=np.greater(fapar, 1, out=c))
+
+            # plant temperature constraint
+            np.subtract(Ta, optimum_temperature, out=fT)
+            fT /= optimum_temperature
+            np.square(fT, out=fT)
+            np.negative(fT, out=fT)
+            np.exp(fT, out=fT)
+            np.copyto(fT, 0.05, where=np.less(Ta, -5, out=c))
+
+            # net radiation of the soil from leaf area index
+            np.subtract(1, fipar, out=rns)
+            np.log(rns, out=rns)
+            np.logical_and(m, np.isfinite(rns, out=c), out=m)
+            np.negative(rns, out=rns)
+            rns *= (1 / KPAR)
+            rns *= -KRN
+            np.exp(rns, out=rns)
+            rns *= net_radiation
+
+            # soil heat flux from fractional vegetation cover
+            np.copyto(fipar, np.nan, where=np.less(fipar, 0, out=c))
+            np.copyto(fipar, np.nan, where=np.greater(fipar, 1, out=c))
+            np.subtract(1, fipar, out=G)
+            G *= 0.265
+            G += 0.05
+            G *= net_radiation
+            np.copyto(G, 0, where=np.less(G, 0, out=c))
+            np.multiply(rns, 0.35, out=t)
+            np.copyto(G, t, where=np.greater(G, t, out=c))
+
+            # soil evaporation (LEs)
+            ks *= PRIESTLEY_TAYLOR_ALPHA
+            ks *= eps
+            np.subtract(rns, G, out=t)
+            np.multiply(ks, t, out=LEs)
+            np.copyto(LEs, np.nan, where=np.less(LEs, 0, out=c))
+            np.logical_and(ms, m, out=ms)
+            np.copyto(LEs, np.nan, where=np.logical_not(ms, out=c))
+
+            # canopy transpiration (LEc), rns becomes the net radiation of the canopy
+            np.subtract(net_radiation, rns, out=rns)
+            kc *= PRIESTLEY_TAYLOR_ALPHA
+            kc *= fg
+            kc *= fT
+            kc *= fapar
+            kc *= eps
+            np.multiply(kc, rns, out=LEc)
+            np.copyto(LEc, 0, where=np.isnan(LEc, out=c))
+            np.copyto(LEc, 0, where=np.less(LEc, 0, out=c))
+            np.copyto(LEc, np.nan, where=np.logical_not(m, out=c))
+
+            # interception evaporation (LEi)
+            np.multiply(rsw, PRIESTLEY_TAYLOR_ALPHA, out=LEi)
+            LEi *= eps
+            LEi *= rns
+            np.copyto(LEi, 0, where=np.less(LEi, 0, out=c))
+            np.copyto(LEi, np.nan, where=np.logical_not(m, out=c))
+
+            # combined evapotranspiration (LE)
+            np.add(LEs, LEc, out=LE)
+            LE += LEi
+            np.copyto(LE, net_radiation, where=np.greater(LE, net_radiation, out=c))
+            np.copyto(LE, np.nan, where=np.isinf(LE, out=c))
+            np.copyto(LE, np.nan, where=np.less(LE, 0, out=c))
+
+            # potential evapotranspiration (pET)
+            np.multiply(eps, PRIESTLEY_TAYLOR_ALPHA, out=PET)
+            np.subtract(net_radiation, G, out=t)
+            PET *= t
+
+    return out
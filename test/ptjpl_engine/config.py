@@ -0,0 +1,120 @@
+import numpy as np
+
+from .topt import TOPT_WINDOW, TOPT_MIN_PERIODS
+
+# saturation vapor pressure [kPa] = base * exp(T * mult / (T + add)), T in celsius
+SVP_CONSTANTS = {
+    'tetens': (0.611, 17.27, 237.7), # FAO-56, PTJPL_github / PTJPL_AMATERASS
+    'buck': (0.61121, 17.502, 240.97), # Buck (1981), AHILST versions
+}
+HUMIDITY_INPUTS = ('rh', 'rh_fraction', 'dew_point')
+RH_BOUNDS = ('nan', 'clip')
+NEGATIVE_VPD = ('nan', 'zero')
+DTYPES = ('float64', 'float32')
+TEMPERATURE_UNITS = ('K', 'C')
+# settings of ptjpl_arrays / site.ptjpl only, the grid kernels (ptjpl_area_fused, ptjpl_area_jit) run the defaults
+SITE_ONLY_DEFAULTS = {'temperature_unit': 'K', 'celsius_offset': 273.15, 'constraint_bounds': 'nan',
+                      'soil_moisture_window': None}
+
+DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE = 1.
+DEFAULT_OPTIMUM_TEMPERATURE = 23.5 # C, area runs without a Topt series
+
+
+class PTJPLConfig:
+    """
+        The variants the copies of the PT-JPL model differ in.
+
+        :param svp: constants of saturation vapor pressure and its slope, a key of SVP_CONSTANTS
+        :param humidity: 'rh', relative humidity input in % (VPD from RH * svp), 'rh_fraction', the same in 0-1,
+                         or 'dew_point', dew point temperature input in K (RH from the water vapor pressure of Td)
+        :param rh_bounds: relative humidity out of 0-1 set to 'nan' or 'clip'ped to the bounds (filter_bad_values)
+        :param negative_vpd: negative vapor pressure deficit set to 'nan' or 'zero'
+        :param topt_window: samples of the trailing means the optimum temperature is taken from (Topt_fun),
+                            None for the constant optimum_temperature
+        :param topt_min_periods: samples a trailing mean needs
+        :param optimum_temperature: C, the constant Topt when topt_window is None (always for grids)
+        :param floor_saturation_vapor_pressure: floor saturation vapor pressure at 1 kPa
+        :param dtype: floating type of the outputs and of the grid calculation, 'float32' halves the memory of the
+                      grids (the difference to 'float64' is bounded by precision.check_float32); the numpy.ma
+                      steps of ptjpl_arrays still run in float64
+        :param columns: dataframe columns of the inputs {'TA': K, 'NDVI': 0-1, 'NETRAD': W/m2, 'humidity': % or K},
+                        optionally 'TA_mean' (K, the air temperature of svp, VPD and fT instead of TA) and
+                        'topt_NETRAD', 'topt_TA' (the series Topt is taken from instead of NETRAD and TA in C,
+                        as they are given)
+        :param temperature_unit: 'K' or 'C', unit of the TA and TA_mean columns (site.ptjpl)
+        :param celsius_offset: subtracted from the temperatures in K, 273 in PTJPL_github / PTJPL_AMATERASS
+        :param constraint_bounds: fAPAR, fg, fM, fSM and the vegetation cover out of 0-1 set to 'nan' or 'clip'ped to
+                                  the bounds (enforce_boundaries)
+        :param soil_moisture_window: samples of the trailing RH and VPD means (min_periods 1) of the soil moisture
+                                     constraint, None for the RH and VPD of each sample
+        """
+    def __init__(self, svp='buck', humidity='dew_point', rh_bounds='clip', negative_vpd='zero',
+                 topt_window=TOPT_WINDOW, topt_min_periods=TOPT_MIN_PERIODS,
+                 optimum_temperature=DEFAULT_OPTIMUM_TEMPERATURE,
+                 floor_saturation_vapor_pressure=DEFAULT_FLOOR_SATURATION_VAPOR_PRESSURE, dtype='float64', columns=None,
+                 temperature_unit='K', celsius_offset=273.15, constraint_bounds='nan', soil_moisture_window=None):
+        dtype = np.dtype(dtype).name
+        for name, value, choices in [('svp', svp, tuple(SVP_CONSTANTS)), ('humidity', humidity, HUMIDITY_INPUTS),
+                                     ('rh_bounds', rh_bounds, RH_BOUNDS), ('negative_vpd', negative_vpd, NEGATIVE_VPD),
+                                     ('dtype', dtype, DTYPES), ('temperature_unit', temperature_unit, TEMPERATURE_UNITS),
+                                     ('constraint_bounds', constraint_bounds, RH_BOUNDS)]:
+            if value not in choices:
+                raise ValueError(name + ' must be one of ' + str(choices) + ', got ' + str(value))
+        self.svp = svp
+        self.humidity = humidity
+        self.rh_bounds = rh_bounds
+        self.negative_vpd = negative_vpd
+        self.topt_window = topt_window
+        self.topt_min_periods = topt_min_periods
+        self.optimum_temperature = optimum_temperature
+        self.floor_saturation_vapor_pressure = floor_saturation_vapor_pressure
+        self.dtype = dtype
+        if columns is None:
+            columns = {'TA': 'TA', 'NDVI': 'NDVI', 'NETRAD': 'NETRAD', 'humidity': 'Td' if humidity == 'dew_point' else 'RH'}
+        self.columns = dict(columns)
+        self.temperature_unit = temperature_unit
+        self.celsius_offset = celsius_offset
+        self.constraint_bounds = constraint_bounds
+        self.soil_moisture_window = soil_moisture_window
+
+    # copy with some settings changed
+    def replace(self, **changes):
+        settings = dict(vars(self))
+        settings.update(changes)
+        return PTJPLConfig(**settings)
+
+    # ValueError when a setting of the site variants is used with a grid kernel
+    def check_grid_kernel(self):
+        settings = [name for name, default in SITE_ONLY_DEFAULTS.items() if getattr(self, name) != default]
+        if self.humidity == 'rh_fraction':
+            settings.append('humidity')
+        if settings:
+            raise ValueError('the grid kernels do not have the ' + ', '.join(settings) + ' settings, use ptjpl_area '
+                             'without fused, out or float32')
+
+    def __repr__(self):
+        return 'PTJPLConfig(' + ', '.join(name + '=' + repr(value) for name, value in vars(self).items()) + ')'
+
+
+# v003 FD sites: ERA5 dew point, RH clipped to 0-1, negative VPD 0, Topt of 2-week means of 10-minute data
+FD_CONFIG = PTJPLConfig()
+# v0-v002 sites: AMATERASS RH, out-of-range RH and negative VPD NaN, daily mean NDVI
+ECOSTRESS_CONFIG = PTJPLConfig(humidity='rh', rh_bounds='nan', negative_vpd='nan',
+                               columns={'TA': 'TA', 'NDVI': 'NDVI_day_mean', 'NETRAD': 'NETRAD', 'humidity': 'RH'})
+# v002 EC sites with 30-minute data: Topt of 2-week means of 30-minute data
+ECOSTRESS_30MIN_CONFIG = ECOSTRESS_CONFIG.replace(topt_window=14*24*2, topt_min_periods=24*2)
+# v001-v002 JP grids: as the sites, with a constant Topt
+AREA_CONFIG = ECOSTRESS_CONFIG.replace(topt_window=None)
+# JP / FD grids in float32, the type the AHI LST and AMATERASS inputs come in
+AREA_FLOAT32_CONFIG = AREA_CONFIG.replace(dtype='float32')
+# PTJPL_github sites (ptjpl_core): FAO-56 svp, TA in C shifted by 273 only, daily minimum RH (0-1) and daily mean TA
+# for VPD and fT, 2-week RH and VPD means in fSM, Topt of 30-sample means of the daily NETRAD and maximum TA
+GITHUB_CONFIG = PTJPLConfig(svp='tetens', humidity='rh_fraction', rh_bounds='nan', negative_vpd='nan', topt_window=30,
+                            topt_min_periods=1, temperature_unit='C', celsius_offset=273., soil_moisture_window=14,
+                            columns={'TA': 'TA', 'TA_mean': 'TA_day_mean', 'NDVI': 'NDVI', 'NETRAD': 'NETRAD',
+                                     'humidity': 'RH_day_min', 'topt_NETRAD': 'NETRAD_day', 'topt_TA': 'TA_day_max'})
+# ptjpl_lib of PTJPL_github: as ptjpl_core with the constraints clipped to 0-1
+GITHUB_CLIP_CONFIG = GITHUB_CONFIG.replace(constraint_bounds='clip')
+# PTJPL_AMATERASS site (ptjpl_ahi): as ptjpl_core with TA in K, hourly minimum AMATERASS RH (%), daily mean NDVI
+AMATERASS_CONFIG = GITHUB_CONFIG.replace(humidity='rh', temperature_unit='K',
+                                         columns=dict(GITHUB_CONFIG.columns, NDVI='NDVI_day_mean', humidity='RH_hour_min'))
@@ -0,0 +1,414 @@
+import numpy as np
+from numpy.ma import exp, log
+
+from .config import SVP_CONSTANTS, FD_CONFIG
+from .topt import site_topt, trailing_means
+
+# Priestley-Taylor coefficient alpha
+PRIESTLEY_TAYLOR_ALPHA = 1.26
+BETA = 1.0
+PSYCHROMETRIC_GAMMA = 0.0662 # Pa/K # http://www.fao.org/docrep/x0490e/x0490e07.htm
+KRN = 0.6
+KPAR = 0.5
+
+# columns ptjpl adds to the dataframe, in the order they are computed
+RESULT_COLUMNS = ['TA_C', 'VPD', 'RH_roll', 'fAPAR', 'fIPAR', 'soil_moisture_constraint', 'savi',
+                  'evapotranspiration', 'potential_evapotranspiration', 'canopy_transpiration',
+                  'interception_evaporation', 'soil_evaporation']
+
+
+# values out of the bounds set to NaN, or to the bounds with bounds='clip'
+def filter_bad_values(matrix, lower_bound, upper_bound, bounds='nan'):
+    if bounds == 'clip':
+        matrix[matrix < lower_bound] = lower_bound
+        matrix[matrix > upper_bound] = upper_bound
+    else:
+        matrix[matrix < lower_bound] = np.nan
+        matrix[matrix > upper_bound] = np.nan
+
+    return matrix
+
+
+# saturation vapor pressure in kPa from air temperature in celsius
+def saturation_vapor_pressure_from_air_temperature(air_temperature, svp='buck'):
+    SVP_BASE, SVP_MULT, SVP_ADD = SVP_CONSTANTS[svp]
+    svp = SVP_BASE * exp((air_temperature * SVP_MULT) / (air_temperature + SVP_ADD))
+
+    return svp
+
+
+# water vapor pressure in kPa from dew point temperature in celsius
+def water_vapor_pressure_from_dew_temperature(dew_temperature):
+    WVP_BASE = 0.613753
+    WVP_MULT = 17.502
+    WVP_ADD = 237.3
+    wvp = WVP_BASE * exp((dew_temperature * WVP_MULT) / (dew_temperature + WVP_ADD))
+
+    return wvp
+
+# calculate Soil-Adjusted Vegetation Index from Normalized Difference Vegetation Index
+# using linear relationship
+def savi_from_ndvi(ndvi):
+    SAVI_MULT = 0.45
+    SAVI_ADD = 0.132
+    savi = ndvi * SAVI_MULT + SAVI_ADD
+
+    return savi
+
+
+# calculate fraction of absorbed photosynthetically active radiation
+# from Soil-Adjusted Vegetation Index using linear relationship
+def fAPAR_from_savi(savi):
+    FAPAR_MULT = 1.3632
+    FAPAR_ADD = -0.048
+
+    fAPAR = savi * FAPAR_MULT + FAPAR_ADD
+
+    return fAPAR
+
+
+# calculate fraction of absorbed photosynthetically active radiation
+# from Normalized Difference Vegetation Index
+def fAPAR_from_ndvi(ndvi):
+    savi = savi_from_ndvi(ndvi)
+    fAPAR = fAPAR_from_savi(savi)
+
+    return fAPAR
+
+
+# calculate slope of saturation vapor pressure to air temperature
+# in pascals over kelvin
+def delta_from_air_temperature(air_temperature, svp='buck'):
+    if svp == 'tetens':
+        return 4098 * (0.6108 * exp(17.27 * air_temperature / (237.7 + air_temperature))) / (air_temperature + 237.3) ** 2
+    return 240.97*17.502*(0.61121 * exp((air_temperature * 17.502) / (air_temperature + 240.97))) / (air_temperature + 240.97) ** 2
+
+
+# cut max and min values to defined values: NaN, or the bounds with bounds='clip'
+def enforce_boundaries(matrix, lower_bound, upper_bound, bounds='nan'):
+    return filter_bad_values(matrix, lower_bound, upper_bound, bounds)
+
+
+# calculate fraction of intercepted photosynthetically active radiation
+# from Normalized Difference Vegetation Index
+def fIPAR_from_ndvi(ndvi):
+    FIPAR_ADD = -0.05
+    fIPAR = ndvi + FIPAR_ADD
+
+    return fIPAR
+
+
+# calculate the relative stress from Temperature
+# this is for high temperatures
+def fT_fun(Tmax,Topt):
+    '''plant temperature constraint '''
+    fT = np.exp(-((Tmax-Topt)/Topt)**2)
+    fT[Tmax<-5]=0.05; # <---- add a cold temperature constraint
+    return fT
+
+
+# copy of a result as it is stored in the dataframe: float, masked values as NaN
+def site_column(matrix, dtype=float):
+    return np.array(np.ma.filled(np.ma.asarray(matrix, dtype=dtype), np.nan))
+
+
+# theory trying to capture temp at peak photosynthesis (wet, green, high vpd, high radiation)
+# (topt.streaming_topt gives the same value without the rolling means)
+def Topt_fun(RN,TMAX,SAVI,VPD):
+    ''' returns the optimal temperature
+        inputs 14 day averages of: RN, TACTUAL, SAVI, VPD'''
+    topt_mask = ~np.isnan(np.array(RN)) & ~np.isnan(TMAX) & ~np.isnan(SAVI) & ~np.isnan(VPD)
+
+    PHEN_RAW = np.ones(np.shape(RN)); PHEN_RAW[:]=np.nan
+
+    VPD_g1 = VPD
+    VPD_g1[VPD<0.5]=0.5
+    PHEN_RAW[topt_mask] = RN[topt_mask]*TMAX[topt_mask]*SAVI[topt_mask]/VPD_g1[topt_mask]
+
+    max_idx = PHEN_RAW.argmax()
+    T_opt = TMAX[max_idx]
+
+    if np.isnan(T_opt):
+        T_opt = np.nanmax(np.nanmax(TMAX))-5
+
+    return T_opt
+
+
+# relative humidity (0-1) and vapor pressure deficit (kPa) from air temperature (C) and RH (% or 0-1) or Td (K),
+# as config.humidity
+def humidity_terms(air_temperature, humidity, config=FD_CONFIG):
+    # calculate saturation vapor pressure in kPa from air temperature in celcius
+    saturation_vapor_pressure = saturation_vapor_pressure_from_air_temperature(air_temperature, config.svp)#[kPA]
+
+    if config.humidity == 'dew_point':
+        # calculate water_vapor_pressure in kPa from dew point temperature in celcius
+        dew_temperature = humidity - 273.15
+        water_vapor_pressure_mean = water_vapor_pressure_from_dew_temperature(dew_temperature)#[kPA]
+        # relative humidity from water vapor pressure and saturation vapor pressure
+        RH = water_vapor_pressure_mean/saturation_vapor_pressure
+        relative_humidity = filter_bad_values(RH, 0., 1., config.rh_bounds)
+        # floor saturation vapor pressure at 1
+        if config.floor_saturation_vapor_pressure:
+            saturation_vapor_pressure[saturation_vapor_pressure < 1] = 1
+    else:
+        # measured RH, water vapor pressure from it and the (floored) saturation vapor pressure
+        RH = humidity/100. if config.humidity == 'rh' else np.array(humidity)
+        relative_humidity = filter_bad_values(RH, 0., 1., config.rh_bounds)
+        if config.floor_saturation_vapor_pressure:
+            saturation_vapor_pressure[saturation_vapor_pressure < 1] = 1
+        water_vapor_pressure_mean = RH*saturation_vapor_pressure
+
+    # calculate vapor pressure deficit from water vapor pressure
+    vapor_pressure_deficit = saturation_vapor_pressure - water_vapor_pressure_mean # [kPa]
+
+    # lower bound of vapor pressure deficit is zero, negative values replaced with nodata or zero
+    vapor_pressure_deficit[vapor_pressure_deficit < 0] = np.nan if config.negative_vpd == 'nan' else 0
+
+    return relative_humidity, vapor_pressure_deficit
+
+
+# fAPARmax and Topt (C) of every series along the last axis, from all of its slots
+def series_parameters(air_temperature_K, ndvi_mean, net_radiation, humidity, config=FD_CONFIG, lengths=None):
+    dtype = np.dtype(config.dtype)
+    air_temperature_K, ndvi_mean, net_radiation, humidity = [
+        np.asarray(values, dtype=dtype) for values in (air_temperature_K, ndvi_mean, net_radiation, humidity)]
+    air_temperature = air_temperature_K - config.celsius_offset
+    fAPAR = enforce_boundaries(fAPAR_from_ndvi(ndvi_mean), 0., 1., config.constraint_bounds)
+    fAPARmax = np.nanmax(site_column(fAPAR, dtype), axis=-1, keepdims=True)
+    if config.topt_window is None:
+        return fAPARmax, config.optimum_temperature
+
+    _, vapor_pressure_deficit = humidity_terms(air_temperature, humidity, config)
+    optimum_temperature = site_topt(site_column(net_radiation, dtype), site_column(air_temperature, dtype),
+                                    site_column(savi_from_ndvi(ndvi_mean), dtype),
+                                    site_column(vapor_pressure_deficit, dtype), lengths, window=config.topt_window,
+                                    min_periods=config.topt_min_periods)
+    return fAPARmax, optimum_temperature
+
+
+def ptjpl_arrays(air_temperature_K, ndvi_mean, net_radiation, humidity, config=FD_CONFIG, lengths=None, verbose=True,
+                 slot_mask=None, fAPARmax=None, optimum_temperature=None, air_temperature_mean_K=None,
+                 topt_inputs=None):
+    """
+        The PT-JPL model on arrays, shared by the site (ptjpl_engine.site) and grid (ptjpl_engine.area) front ends:
+        one site series (time,), several sites padded with NaN at the end (site, time), or a grid.
+
+        :param air_temperature_K, ndvi_mean, net_radiation:
+            TA (K), NDVI (0-1.0) and NETRAD (W/m2)
+        :param humidity:
+            RH (% or 0-1) or Td (K), as config.humidity
+        :param config:
+            PTJPLConfig of the model variant
+        :param lengths:
+            Number of samples of every site for (site, time) arrays (default: all of them)
+        :param slot_mask:
+            Bool array (broadcast to the input shape) of the slots to evaluate, e.g. the daytime slots of
+            solar_slots.site_daytime_mask; the other slots are skipped and NaN in every output. fAPARmax and
+            the optimum temperature are still those of all the slots (series_parameters), so the evaluated
+            slots get the values of a run without the mask
+        :param fAPARmax:
+            Maximum fAPAR, per series along the last axis when None
+        :param optimum_temperature:
+            Topt (C), per series along the last axis from config.topt_window when None
+            (config.optimum_temperature when that is None)
+        :param air_temperature_mean_K:
+            Mean TA (K) of the saturation vapor pressure, VPD and fT (default: air_temperature_K)
+        :param topt_inputs:
+            (NETRAD, TA) series the optimum temperature is taken from, as they are given
+            (default: net_radiation and the TA in C)
+
+        :return:
+            dict of the RESULT_COLUMNS (masked values as NaN) in config.dtype, same shape as the inputs
+        """
+    results = {}
+    shape = np.shape(air_temperature_K)
+    # inputs and results in config.dtype (the numpy.ma steps promote float32 to float64 in between)
+    dtype = np.dtype(config.dtype)
+    air_temperature_K, ndvi_mean, net_radiation, humidity = [
+        np.asarray(values, dtype=dtype) for values in (air_temperature_K, ndvi_mean, net_radiation, humidity)]
+    if air_temperature_mean_K is not None:
+        air_temperature_mean_K = np.asarray(air_temperature_mean_K, dtype=dtype)
+    if slot_mask is not None:
+        if air_temperature_mean_K is not None or topt_inputs is not None or config.soil_moisture_window is not None:
+            raise ValueError('slot_mask needs all the slots of air_temperature_mean_K, topt_inputs and '
+                             'config.soil_moisture_window, run without it')
+        slot_mask = np.broadcast_to(np.asarray(slot_mask, dtype=bool), shape)
+        if fAPARmax is None or optimum_temperature is None:
+            series_fAPARmax, series_optimum_temperature = series_parameters(
+                air_temperature_K, ndvi_mean, net_radiation, humidity, config, lengths)
+            fAPARmax = series_fAPARmax if fAPARmax is None else fAPARmax
+            if optimum_temperature is None:
+                optimum_temperature = series_optimum_temperature
+        air_temperature_K, ndvi_mean, net_radiation, humidity = [
+            values[slot_mask] for values in (air_temperature_K, ndvi_mean, net_radiation, humidity)]
+
+    # output column of the evaluated slots (the full input shape, NaN for skipped slots)
+    def column(matrix):
+        values = site_column(matrix, dtype)
+        if slot_mask is None:
+            return values
+        full_values = np.full(shape, np.nan, dtype=dtype)
+        full_values[slot_mask] = values
+        return full_values
+
+    # per-site values (keepdims) at the evaluated slots
+    def at_slots(site_values):
+        if slot_mask is None or np.ndim(site_values) == 0:
+            return site_values
+        return np.broadcast_to(site_values, shape)[slot_mask]
+
+    # convert temperatures from kelvin to celsius
+    air_temperature = air_temperature_K - config.celsius_offset
+    results['TA_C']= column(air_temperature)
+    if air_temperature_mean_K is None:
+        air_temperature_mean = air_temperature
+    else:
+        air_temperature_mean = air_temperature_mean_K - config.celsius_offset
+
+    # calculate surface wetness values
+    if verbose:
+        print('calculating surface wetness values [%]')
+        print('calculating vapor pressure deficit [kPa]')
+
+    relative_humidity, vapor_pressure_deficit = humidity_terms(air_temperature_mean, humidity, config)
+    results['VPD']= column(vapor_pressure_deficit)
+
+    # calculate relative surface wetness from relative humidity
+    results['RH_roll']=column(relative_humidity)
+    relative_surface_wetness = relative_humidity ** 4
+    relative_surface_wetness[air_temperature<=0]=0.; # FROZEN WATER
+    # calculate slope of saturation to vapor pressure curve Pa/K
+    delta = delta_from_air_temperature(air_temperature, config.svp)
+    # calculate delta / (delta + gamma)
+    epsilon = delta / (delta + PSYCHROMETRIC_GAMMA)
+
+    # calculate vegetation values
+    if verbose:
+        print('calculating vegetation values')
+
+    # calculate fAPAR & fAPARmax from NDVI mean
+    fAPAR = fAPAR_from_ndvi(ndvi_mean)
+    fAPAR = enforce_boundaries(fAPAR,0.,1., config.constraint_bounds)
+    if fAPARmax is None:
+        fAPARmax = np.nanmax(column(fAPAR), axis=-1, keepdims=True)
+    fAPARmax = at_slots(np.asarray(fAPARmax, dtype=dtype))
+    results['fAPAR']=column(fAPAR)
+
+    # calculate fIPAR from NDVI mean
+    fIPAR = fIPAR_from_ndvi(ndvi_mean)
+    results['fIPAR']=column(fIPAR)
+    # calculate green canopy fraction (fg) from fAPAR and fIPAR, constrained between zero and one
+    green_canopy_fraction = enforce_boundaries(fAPAR / fIPAR, 0, 1, config.constraint_bounds)
+
+    # calculate plant moisture constraint (fM) from fraction of photosynthetically active radiation,
+    # constrained between zero and one
+    plant_moisture_constraint = enforce_boundaries(fAPAR / fAPARmax, 0, 1, config.constraint_bounds)
+
+    # calculate soil moisture constraint from relative humidity and vapor pressure deficit,
+    # constrained between zero and one (of their trailing means with config.soil_moisture_window)
+    if config.soil_moisture_window is None:
+        soil_moisture_constraint = relative_humidity ** vapor_pressure_deficit
+    else:
+        soil_moisture_constraint = (trailing_means(results['RH_roll'], config.soil_moisture_window) **
+                                    trailing_means(results['VPD'], config.soil_moisture_window))
+    soil_moisture_constraint = enforce_boundaries(soil_moisture_constraint, 0, 1, config.constraint_bounds)
+    soil_moisture_constraint[air_temperature<0]=0.00
+    results['soil_moisture_constraint']=column(soil_moisture_constraint)
+
+    # calculate SAVI from NDVI
+    savi_mean = savi_from_ndvi(ndvi_mean)
+    results['savi']=column(savi_mean)
+
+    # calculate optimum_temperature from: R𝑛 , Tair, SAVI, and VPD used to calculate Topt are all 2-week forward averages,
+    # streamed over the series without the four rolling means of Topt_fun
+    if optimum_temperature is None:
+        if config.topt_window is None:
+            optimum_temperature = config.optimum_temperature
+        else:
+            if topt_inputs is None:
+                topt_net_radiation, topt_air_temperature = column(net_radiation), results['TA_C']
+            else:
+                topt_net_radiation, topt_air_temperature = [site_column(values, dtype) for values in topt_inputs]
+            optimum_temperature = site_topt(topt_net_radiation, topt_air_temperature, results['savi'], results['VPD'],
+                                            lengths, window=config.topt_window, min_periods=config.topt_min_periods)
+
+    if verbose:
+        print('calculating plant optimum temperature')
+        print(str(optimum_temperature)+ ' C')
+    optimum_temperature = at_slots(np.asarray(optimum_temperature, dtype=dtype))
+
+    # calculate plant temperature constraint (fT) from optimal phenology
+    plant_temperature_constraint = fT_fun(air_temperature_mean, optimum_temperature)
+
+    # calculate leaf area index : now extract from MODIS dataset
+    leaf_area_index = -log(1 - fIPAR) * (1 / KPAR)
+
+    # soil evaporation
+    if verbose:
+        print('calculating soil evaporation')
+
+    # caluclate net radiation of the soil from leaf area index
+    soil_net_radiation = net_radiation * exp(-KRN * leaf_area_index)
+
+    # take fractional vegetation cover from fraction of photosynthetically active radiation
+    fractional_vegetation_cover = enforce_boundaries(fIPAR, 0, 1, config.constraint_bounds)
+
+    # calculate instantaneous soil heat flux from net radiation and fractional vegetation cover
+    soil_heat_flux = net_radiation * (0.05 + (1 - fractional_vegetation_cover) * 0.265)
+    # change the above to METRIC G
+    soil_heat_flux[soil_heat_flux < 0] = 0
+    soil_heat_flux[soil_heat_flux > 0.35 * soil_net_radiation] = 0.35 * soil_net_radiation[soil_heat_flux > 0.35 * soil_net_radiation]
+
+    # calculate soil evaporation (LEs) from relative surface wetness, soil moisture constraint,
+    # priestley taylor coefficient, epsilon = delta / (delta + gamma), net radiation of the soil,
+    # and soil heat flux
+    soil_evaporation = (relative_surface_wetness + soil_moisture_constraint * (1 - relative_surface_wetness)) * PRIESTLEY_TAYLOR_ALPHA * epsilon * (soil_net_radiation - soil_heat_flux)
+    soil_evaporation[soil_evaporation < 0] = np.nan
+
+    # canopy transpiration
+    if verbose:
+        print('calculating canopy transpiration')
+
+    # calculate net radiation of the canopy from net radiation of the soil
+    canopy_net_radiation = net_radiation - soil_net_radiation
+
+    # calculate canopy transpiration (LEc) from priestley taylor, relative surface wetness,
+    # green canopy fraction, plant temperature constraint, plant moisture constraint,
+    # epsilon = delta / (delta + gamma), and net radiation of the canopy
+    canopy_transpiration = PRIESTLEY_TAYLOR_ALPHA * (1 - relative_surface_wetness) * green_canopy_fraction * plant_temperature_constraint * plant_moisture_constraint * epsilon * canopy_net_radiation
+    canopy_transpiration[np.isnan(canopy_transpiration)] = 0
+    canopy_transpiration[canopy_transpiration < 0] = 0
+
+    # interception evaporation
+    if verbose:
+        print('calculating interception evaporation')
+    # calculate interception evaporation (LEi) from relative surface wetness, priestley taylor coefficient,
+    # epsilon = delta / (delta + gamma), and net radiation of the canopy
+    interception_evaporation = relative_surface_wetness * PRIESTLEY_TAYLOR_ALPHA * epsilon * canopy_net_radiation
+    interception_evaporation[interception_evaporation < 0] = 0
+
+    # combined evapotranspiration
+    if verbose:
+        print('combining evapotranspiration')
+    # combine soil evaporation (LEs), canopy transpiration (LEc), and interception evaporation (LEi)
+    # into instantaneous evapotranspiration (LE)
+    evapotranspiration = soil_evaporation + canopy_transpiration + interception_evaporation
+    evapotranspiration[evapotranspiration > net_radiation] = net_radiation[evapotranspiration > net_radiation]
+    evapotranspiration[np.isinf(evapotranspiration)] = np.nan
+    evapotranspiration[evapotranspiration < 0] = np.nan
+
+    # potential evapotranspiration
+    if verbose:
+        print('calculating potential evapotranspiration')
+    # calculate potential evapotranspiration (pET) from priestley taylor coefficient,
+    # epsilon = delta / (delta + gamma), net radiation, and soil heat flux
+    potential_evapotranspiration = PRIESTLEY_TAYLOR_ALPHA * epsilon * (net_radiation - soil_heat_flux)
+
+    results['evapotranspiration'] =           column(evapotranspiration)
+    # potential et added to results
+    results['potential_evapotranspiration']=  column(potential_evapotranspiration)
+    # components evapotranspriation added for partitioning study
+    results['canopy_transpiration'] =         column(canopy_transpiration)
+    results['interception_evaporation'] =     column(interception_evaporation)
+    results['soil_evaporation'] =             column(soil_evaporation)
+    return results
@@ -0,0 +1,103 @@
+import numpy as np
+
+from .area import AREA_OUTPUTS, soil_heat_flux_from_ndvi
+
+LAMBDA_E = 2.460*10**6 # J kg^-1, latent heat of vaporization as in LE_2_ETcm
+RHO_W = 1000 # kg m^-3
+SECONDS_PER_DAY = 86400
+
+
+# daily mean latent heat (W/m2) to evapotranspiration (mm/day), LE_2_ETcm in mm
+def LE_2_ETmm(LE_Wm2):
+    return np.asarray(LE_Wm2, dtype=float) * (SECONDS_PER_DAY * 1000) / (LAMBDA_E * RHO_W)
+
+
+class DailyET:
+    """
+        Daily maps of the ptjpl_area results of a grid, folded in one time step at a time (add), so a day
+        is not read again from its 144 step files. For every output of AREA_OUTPUTS the sum and the number
+        of valid (non-NaN) samples are kept. The daily evapotranspiration is the one of PT-JPL,
+        daily_radiation * evaporative_fraction: the evaporative fraction is sum(LE) / sum(Rn - G) over the
+        samples with a valid LE, the daily radiation the mean net radiation of all the steps.
+        Accumulators of different parts of a day (e.g. pool workers) are combined with merge.
+
+        :param shape: (rows, cols) of the grid
+        """
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.sums = np.zeros((len(AREA_OUTPUTS),) + self.shape)
+        self.counts = np.zeros((len(AREA_OUTPUTS),) + self.shape, dtype=np.uint16) # 144 steps a day
+        self.latent_heat = np.zeros(self.shape) # sum of LE where Rn - G is valid too
+        self.available_energy = np.zeros(self.shape) # sum of Rn - G where LE is valid
+        self.net_radiation = np.zeros(self.shape)
+        self.net_radiation_counts = np.zeros(self.shape, dtype=np.uint16)
+        self.n_steps = 0
+
+    def add(self, results, r_net_input_array, ndvi_input_array):
+        """
+            :param results: (5, rows, cols) ptjpl_area results of the step, in AREA_OUTPUTS order
+            :param r_net_input_array, ndvi_input_array: NETRAD (W/m2) and NDVI (0-1.0) inputs of the step
+            """
+        results = np.asarray(results)
+        if results.shape != self.sums.shape:
+            raise ValueError('results must have shape ' + str(self.sums.shape) + ', got ' + str(results.shape))
+        for sums, counts, values in zip(self.sums, self.counts, results):
+            valid = ~np.isnan(values)
+            np.add(sums, values, out=sums, where=valid)
+            counts += valid
+
+        net_radiation = np.asarray(r_net_input_array, dtype=float)
+        available_energy = net_radiation - soil_heat_flux_from_ndvi(net_radiation, ndvi_input_array)
+        valid = ~np.isnan(results[0]) & np.isfinite(available_energy)
+        np.add(self.latent_heat, results[0], out=self.latent_heat, where=valid)
+        np.add(self.available_energy, available_energy, out=self.available_energy, where=valid)
+        valid = np.isfinite(net_radiation)
+        np.add(self.net_radiation, net_radiation, out=self.net_radiation, where=valid)
+        self.net_radiation_counts += valid
+        self.n_steps += 1
+
+    def merge(self, other):
+        if other.shape != self.shape:
+            raise ValueError('cannot merge a grid of shape ' + str(other.shape) + ' into ' + str(self.shape))
+        for name in ['sums', 'counts', 'latent_heat', 'available_energy', 'net_radiation', 'net_radiation_counts']:
+            values = getattr(self, name)
+            values += getattr(other, name)
+        self.n_steps += other.n_steps
+        return self
+
+    # (5, rows, cols) daily means of the AREA_OUTPUTS over their valid samples (W/m2)
+    def means(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.counts > 0, self.sums / self.counts, np.nan)
+
+    def evaporative_fraction(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.available_energy > 0, self.latent_heat / self.available_energy, np.nan)
+
+    # mean net radiation of the day (W/m2)
+    def daily_radiation(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.net_radiation_counts > 0, self.net_radiation / self.net_radiation_counts, np.nan)
+
+    # daily_radiation * evaporative_fraction (W/m2)
+    def daily_evapotranspiration(self):
+        return self.daily_radiation() * self.evaporative_fraction()
+
+    def products(self):
+        """
+            :return:
+                {name: array} of the daily maps, e.g. for numpy.savez: <output>_mean and <output>_count of
+                every AREA_OUTPUTS, evaporative_fraction, daily_radiation, daily_evapotranspiration (W/m2),
+                daily_evapotranspiration_mm (mm/day) and n_steps
+            """
+        products = {}
+        for name, means, counts in zip(AREA_OUTPUTS, self.means(), self.counts):
+            products[name + '_mean'] = means
+            products[name + '_count'] = counts
+        daily_evapotranspiration = self.daily_evapotranspiration()
+        products['evaporative_fraction'] = self.evaporative_fraction()
+        products['daily_radiation'] = self.daily_radiation()
+        products['daily_evapotranspiration'] = daily_evapotranspiration
+        products['daily_evapotranspiration_mm'] = LE_2_ETmm(daily_evapotranspiration)
+        products['n_steps'] = np.array(self.n_steps)
+        return products
@@ -0,0 +1,227 @@
+import numpy as np
+
+from .config import AREA_CONFIG, SVP_CONSTANTS
+from .core import PRIESTLEY_TAYLOR_ALPHA, PSYCHROMETRIC_GAMMA, KRN, KPAR
+from .area import fAPARmax_from_ndvi
+
+# numba is optional: without it NUMBA_AVAILABLE is False and ptjpl_area_jit raises ImportError
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+
+# the per-pixel chain of ptjpl_area_fused, one row per prange iteration
+def _ptjpl_rows(r_net, humidity, ta, ndvi, out, fAPARmax, optimum_temperature, svp_base, svp_mult, svp_add,
+                tetens, dew_point, rh_lower, rh_upper, negative_vpd, floor_saturation_vapor_pressure):
+    rows, cols = r_net.shape
+    for i in numba.prange(rows):
+        for j in range(cols):
+            net_radiation = r_net[i, j]
+            # air temperature in celsius
+            Ta = ta[i, j] - 273.15
+
+            # saturation vapor pressure [kPa] and epsilon = delta / (delta + gamma)
+            svp = np.exp(Ta * svp_mult / (Ta + svp_add))
+            if tetens:
+                eps = svp * 0.6108 * 4098
+                svp *= svp_base
+                t = Ta + 237.3
+            else:
+                svp *= svp_base
+                eps = svp * (240.97*17.502)
+                t = Ta + svp_add
+            eps /= t * t
+            eps /= eps + PSYCHROMETRIC_GAMMA
+
+            # relative humidity, vapor pressure deficit and relative surface wetness
+            if dew_point:
+                # water vapor pressure of the dew point
+                t = humidity[i, j] - 273.15
+                t = np.exp(t * 17.502 / (t + 237.3)) * 0.613753
+                RH = t / svp
+                soil_unmasked = np.isfinite(RH)
+            else:
+                RH = humidity[i, j] / 100.
+                soil_unmasked = True
+            if RH < 0.:
+                RH = rh_lower
+            if RH > 1.:
+                RH = rh_upper
+            if floor_saturation_vapor_pressure and svp < 1:
+                svp = 1.
+            if not dew_point:
+                t = RH * svp
+            vpd = svp - t
+            if vpd < 0:
+                vpd = negative_vpd
+            rsw = RH ** 4
+            # pixels numpy.ma does not mask in ptjpl_arrays, for LEc and LEi and, with soil_unmasked, for LEs
+            unmasked = soil_unmasked and np.isfinite(rsw) if dew_point else True
+            if Ta <= 0:
+                rsw = 0.
+                unmasked = True
+            unmasked = unmasked and np.isfinite(eps)
+
+            # soil moisture constraint, then (rsw + fSM * (1 - rsw)) for soil evaporation
+            ks = RH ** vpd
+            if dew_point:
+                soil_unmasked = soil_unmasked and np.isfinite(ks)
+            if ks < 0 or ks > 1:
+                ks = np.nan
+            if Ta < 0:
+                ks = 0.
+                soil_unmasked = True
+            kc = 1 - rsw
+            ks = ks * kc + rsw
+
+            # vegetation values: fAPAR, fIPAR, green canopy fraction and plant moisture constraint
+            fapar = ((ndvi[i, j] * 0.45 + 0.132) * 1.3632) + -0.048
+            if fapar < 0. or fapar > 1.:
+                fapar = np.nan
+            fipar = ndvi[i, j] + -0.05
+            fg = fapar / fipar
+            if fg < 0 or fg > 1:
+                fg = np.nan
+            fapar /= fAPARmax
+            if fapar < 0 or fapar > 1:
+                fapar = np.nan
+
+            # plant temperature constraint
+            fT = (Ta - optimum_temperature) / optimum_temperature
+            fT = np.exp(-(fT * fT))
+            if Ta < -5:
+                fT = 0.05
+
+            # net radiation of the soil from leaf area index
+            t = np.log(1 - fipar)
+            unmasked = unmasked and np.isfinite(t)
+            rns = np.exp(-t * (1 / KPAR) * -KRN) * net_radiation
+
+            # soil heat flux from fractional vegetation cover
+            if fipar < 0 or fipar > 1:
+                fipar = np.nan
+            G = ((1 - fipar) * 0.265 + 0.05) * net_radiation
+            if G < 0:
+                G = 0.
+            t = rns * 0.35
+            if G > t:
+                G = t
+
+            # soil evaporation (LEs)
+            LEs = ks * PRIESTLEY_TAYLOR_ALPHA * eps * (rns - G)
+            if LEs < 0 or not (unmasked and soil_unmasked):
+                LEs = np.nan
+
+            # canopy transpiration (LEc) from the net radiation of the canopy
+            rnc = net_radiation - rns
+            LEc = kc * PRIESTLEY_TAYLOR_ALPHA * fg * fT * fapar * eps * rnc
+            if np.isnan(LEc) or LEc < 0:
+                LEc = 0.
+            if not unmasked:
+                LEc = np.nan
+
+            # interception evaporation (LEi)
+            LEi = rsw * PRIESTLEY_TAYLOR_ALPHA * eps * rnc
+            if LEi < 0:
+                LEi = 0.
+            if not unmasked:
+                LEi = np.nan
+
+            # combined evapotranspiration (LE)
+            LE = LEs + LEc + LEi
+            if LE > net_radiation:
+                LE = net_radiation
+            if np.isinf(LE) or LE < 0:
+                LE = np.nan
+
+            out[0, i, j] = LE
+            out[1, i, j] = LEc
+            out[2, i, j] = LEi
+            out[3, i, j] = LEs
+            # potential evapotranspiration (pET)
+            out[4, i, j] = eps * PRIESTLEY_TAYLOR_ALPHA * (net_radiation - G)
+
+
+if NUMBA_AVAILABLE:
+    # error_model='numpy': divisions by zero give inf / NaN as in the numpy kernels;
+    # once the kernel has run, a process should not fork (multiprocessing.Pool) any more: the numba threads are
+    # not fork-safe, run the kernel in the pool workers instead (ptjpl_area_scheduler)
+    _ptjpl_rows = numba.njit(parallel=True, error_model='numpy', cache=True)(_ptjpl_rows)
+
+
+# numba only takes native byte order (the AMATERASS inputs are big-endian '>f4')
+def native_array(values):
+    values = np.asarray(values)
+    if not values.dtype.isnative:
+        values = values.astype(values.dtype.newbyteorder('='))
+    return values
+
+
+def ptjpl_area_jit(r_net_input_array,
+                   humidity_input_array,
+                   ta_input_array,
+                   ndvi_input_array, out=None, verbose=False, floor_saturation_vapor_pressure=None,
+                   optimum_temperature=None, fAPARmax=None, config=AREA_CONFIG, dtype=None, threads=None):
+    """
+        numba version of ptjpl_area_fused: the per-pixel chain is compiled and the rows are spread over
+        all cores (numba prange), every intermediate is a scalar, so nothing but out is allocated.
+        fAPARmax, the only value over the whole grid, is found in a first pass (fAPARmax_from_ndvi).
+        The pixels are calculated in float64 and stored in out's type; the results match
+        ptjpl_area_fused to the rounding of exp / log.
+
+        :param out:
+            Optional (5, rows, cols) buffer for the results, allocated in dtype when None
+        :param optimum_temperature:
+            Topt (C), config.optimum_temperature when None
+        :param fAPARmax:
+            Maximum fAPAR of the grid, computed from ndvi_input_array when None
+        :param dtype:
+            'float32' or 'float64' of out when it is allocated (config.dtype when None)
+        :param threads:
+            Number of numba threads, all cores when None
+
+        :return:
+            out with evapotranspiration, canopy_transpiration, interception_evaporation,
+            soil_evaporation, potential_evapotranspiration
+        """
+    if not NUMBA_AVAILABLE:
+        raise ImportError('ptjpl_area_jit needs numba, use ptjpl_area_fused without it')
+    config.check_grid_kernel()
+    if floor_saturation_vapor_pressure is None:
+        floor_saturation_vapor_pressure = config.floor_saturation_vapor_pressure
+    if optimum_temperature is None:
+        optimum_temperature = config.optimum_temperature
+    dtype = np.dtype(config.dtype if dtype is None else dtype)
+    svp_base, svp_mult, svp_add = SVP_CONSTANTS[config.svp]
+    rh_lower, rh_upper = (0., 1.) if config.rh_bounds == 'clip' else (np.nan, np.nan)
+    negative_vpd = np.nan if config.negative_vpd == 'nan' else 0.
+
+    rows, cols = np.shape(r_net_input_array)
+    if out is None:
+        out = np.empty((5, rows, cols), dtype=dtype)
+    if out.shape != (5, rows, cols):
+        raise ValueError('out must have shape ' + str((5, rows, cols)) + ', got ' + str(out.shape))
+
+    if fAPARmax is None:
+        if verbose:
+            print('calculating maximum fAPAR')
+        fAPARmax = fAPARmax_from_ndvi(ndvi_input_array)
+
+    inputs = [native_array(values) for values in (r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array)]
+    # the number of numba threads is process-wide, it is set back once the kernel has run
+    process_threads = numba.get_num_threads()
+    if threads is not None:
+        numba.set_num_threads(threads)
+    try:
+        if verbose:
+            print('calculating evapotranspiration on ' + str(numba.get_num_threads()) + ' threads')
+        _ptjpl_rows(*inputs, np.asarray(out), float(fAPARmax), float(optimum_temperature), svp_base, svp_mult, svp_add,
+                    config.svp == 'tetens', config.humidity == 'dew_point', rh_lower, rh_upper, negative_vpd,
+                    bool(floor_saturation_vapor_pressure))
+    finally:
+        numba.set_num_threads(process_threads)
+
+    return out
@@ -0,0 +1,59 @@
+import numpy as np
+
+from .config import AREA_CONFIG
+from .area import ptjpl_area_fused, fAPARmax_from_ndvi, AREA_OUTPUTS, DEFAULT_BLOCK_ROWS
+
+# W/m2, LE difference accepted between the float32 and float64 runs of a grid
+# (float32 keeps ~7 significant digits: ~1e-3 W/m2 on LE up to 1000 W/m2)
+FLOAT32_LE_TOLERANCE = 0.01
+# fraction of the pixels allowed over the tolerance or NaN in only one run: a rounding can move a pixel across
+# one of the bounds the model filters at (e.g. fAPAR / fIPAR = 1 near NDVI 0.47 switches canopy transpiration off)
+FLOAT32_FLIP_FRACTION = 1e-5
+
+
+def compare_precision(r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array, config=AREA_CONFIG,
+                      block_rows=DEFAULT_BLOCK_ROWS):
+    """
+        Runs ptjpl_area_fused on one grid in float64 and in float32 (same fAPARmax and inputs)
+        and measures the difference of every output.
+
+        :return:
+            {output name: {'max_abs': W/m2, 'p99_abs': W/m2, 'max_rel': max |diff| / max(|float64|, 1),
+                           'nan_mismatch': pixels NaN in only one of the runs,
+                           'over_tolerance': pixels differing by more than FLOAT32_LE_TOLERANCE}}, in AREA_OUTPUTS order
+        """
+    fAPARmax = fAPARmax_from_ndvi(ndvi_input_array, block_rows)
+    inputs = (r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array)
+    results_64 = ptjpl_area_fused(*inputs, fAPARmax=fAPARmax, block_rows=block_rows, config=config, dtype='float64')
+    results_32 = ptjpl_area_fused(*inputs, fAPARmax=fAPARmax, block_rows=block_rows, config=config, dtype='float32')
+
+    stats = {}
+    for name, values_64, values_32 in zip(AREA_OUTPUTS, results_64, results_32):
+        difference = np.abs(values_32 - values_64)
+        valid = ~np.isnan(difference)
+        stats[name] = {
+            'max_abs': float(difference[valid].max()) if valid.any() else np.nan,
+            'p99_abs': float(np.percentile(difference[valid], 99)) if valid.any() else np.nan,
+            'max_rel': float((difference[valid] / np.fmax(np.abs(values_64[valid]), 1)).max()) if valid.any() else np.nan,
+            'nan_mismatch': int(np.count_nonzero(np.isnan(values_32) != np.isnan(values_64))),
+            'over_tolerance': int(np.count_nonzero(difference[valid] > FLOAT32_LE_TOLERANCE)),
+        }
+    return stats
+
+
+# compare_precision with guardrails: ValueError when more than flip_fraction of the pixels of an output
+# differ by more than FLOAT32_LE_TOLERANCE or are NaN in only one of the runs
+def check_float32(r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array, config=AREA_CONFIG,
+                  flip_fraction=FLOAT32_FLIP_FRACTION, block_rows=DEFAULT_BLOCK_ROWS, verbose=True):
+    stats = compare_precision(r_net_input_array, humidity_input_array, ta_input_array, ndvi_input_array, config,
+                              block_rows)
+    max_flips = int(flip_fraction * np.size(r_net_input_array))
+    for name, output_stats in stats.items():
+        flips = output_stats['over_tolerance'] + output_stats['nan_mismatch']
+        if verbose:
+            print(name + ': max ' + str(output_stats['max_abs']) + ' W/m2, p99 ' + str(output_stats['p99_abs'])
+                  + ' W/m2, ' + str(flips) + ' pixels over ' + str(FLOAT32_LE_TOLERANCE) + ' W/m2 or NaN in one run')
+        if flips > max_flips:
+            raise ValueError('float32 ' + name + ': ' + str(flips) + ' pixels differ from float64 by more than '
+                             + str(FLOAT32_LE_TOLERANCE) + ' W/m2 or are NaN in one run (at most ' + str(max_flips) + ')')
+    return stats
@@ -0,0 +1,50 @@
+import numpy as np
+
+from .config import FD_CONFIG
+from .core import ptjpl_arrays
+
+
+def ptjpl(AA, config=FD_CONFIG, verbose=True, floor_saturation_vapor_pressure=None):
+    """
+        PT-JPL on the dataframe of one site, the columns of ptjpl_arrays are added to it.
+
+        :param AA:
+            dataframe with the config.columns inputs: TA (K, or C with config.temperature_unit 'C'), NDVI (0-1.0),
+            NETRAD (W/m2) and RH (% or 0-1) or Td (K), and the optional TA_mean, topt_NETRAD and topt_TA
+        :param config:
+            PTJPLConfig of the model variant
+        :param verbose:
+            Flag to output activity to console
+        :param floor_saturation_vapor_pressure:
+            Option to floor calculation of saturation vapor pressure at 1 to avoid anomalous output
+            (config.floor_saturation_vapor_pressure when None)
+
+        :return:
+            AA with the RESULT_COLUMNS of the engine (evapotranspiration, potential_evapotranspiration,
+            canopy_transpiration, interception_evaporation, soil_evaporation and the intermediate values)
+        """
+    if floor_saturation_vapor_pressure is not None:
+        config = config.replace(floor_saturation_vapor_pressure=floor_saturation_vapor_pressure)
+    columns = config.columns
+    air_temperature_K =       np.array(AA[columns['TA']])          # (K)
+    ndvi_mean=                np.array(AA[columns['NDVI']])        # (0-1.0)
+    net_radiation=            np.array(AA[columns['NETRAD']])      # (W/m2)
+    humidity =                np.array(AA[columns['humidity']])    # RH (% or 0-1) or Td (K)
+    air_temperature_mean_K = None
+    if 'TA_mean' in columns:
+        air_temperature_mean_K = np.array(AA[columns['TA_mean']])  # (K)
+    if config.temperature_unit == 'C':
+        air_temperature_K = air_temperature_K + 273.15
+        if air_temperature_mean_K is not None:
+            air_temperature_mean_K = air_temperature_mean_K + 273.15
+    topt_inputs = None
+    if 'topt_NETRAD' in columns:
+        topt_inputs = (np.array(AA[columns['topt_NETRAD']]), np.array(AA[columns['topt_TA']]))
+
+    # append new data to array
+    results = AA
+    for column, values in ptjpl_arrays(air_temperature_K, ndvi_mean, net_radiation, humidity, config, verbose=verbose,
+                                       air_temperature_mean_K=air_temperature_mean_K,
+                                       topt_inputs=topt_inputs).items():
+        results[column] = values
+    return results
@@ -0,0 +1,142 @@
+import numpy
+
+time_internal = 10 # mins
+SUNRISE_ZENITH = 90.833 # °, geometric horizon plus refraction, as the NOAA sunrise/sunset times
+DEFAULT_MAX_ZENITH = SUNRISE_ZENITH
+# zenith angles (slots x points) computed at once, bounds the float64 temporaries of the masks of grids
+# (one slot at a time for a 2500 x 3000 grid, all the slots of a site series at once)
+DEFAULT_BLOCK_VALUES = 2**22
+EXTENT_RESOLUTION = 0.1 # °, points of extent_points
+DEFAULT_PLAN_PIXELS = 10 # grid_daytime_mask plans on every 10th pixel center (0.1° on the 0.01° JP grid)
+
+
+# fractional year (radians), equation of time (minutes) and solar declination (radians) of UTC times
+# (NOAA general solar position, accurate to about a minute)
+def solar_terms(utc_times):
+    utc_times = numpy.asarray(utc_times, dtype='datetime64[s]')
+    year_start = utc_times.astype('datetime64[Y]')
+    year_days = ((year_start + 1).astype('datetime64[D]') - year_start.astype('datetime64[D]')).astype(float)
+    days = (utc_times - year_start.astype('datetime64[s]')).astype(float) / 86400.
+    gamma = 2 * numpy.pi / year_days * (days - 0.5)
+    eqtime = 229.18 * (0.000075 + 0.001868*numpy.cos(gamma) - 0.032077*numpy.sin(gamma)
+                       - 0.014615*numpy.cos(2*gamma) - 0.040849*numpy.sin(2*gamma))
+    decl = (0.006918 - 0.399912*numpy.cos(gamma) + 0.070257*numpy.sin(gamma) - 0.006758*numpy.cos(2*gamma)
+            + 0.000907*numpy.sin(2*gamma) - 0.002697*numpy.cos(3*gamma) + 0.00148*numpy.sin(3*gamma))
+    return gamma, eqtime, decl
+
+
+# solar zenith angle (°) at UTC times (time,) for points of any shape (sites (site,), grids (y, x)): (time,) + points
+def solar_zenith(utc_times, lats, lons):
+    utc_times = numpy.asarray(utc_times, dtype='datetime64[s]')
+    lats = numpy.asarray(lats, dtype=float)
+    lons = numpy.asarray(lons, dtype=float)
+    _, eqtime, decl = solar_terms(utc_times)
+    expand = (slice(None),) + (None,) * lats.ndim
+    utc_minutes = (utc_times - utc_times.astype('datetime64[D]')).astype(float) / 60.
+    true_solar_time = (utc_minutes + eqtime)[expand] + 4 * lons
+    hour_angle = numpy.radians(true_solar_time / 4 - 180)
+    lat_rad = numpy.radians(lats)
+    cos_zenith = numpy.sin(lat_rad) * numpy.sin(decl)[expand] + numpy.cos(lat_rad) * numpy.cos(decl)[expand] * numpy.cos(hour_angle)
+    return numpy.degrees(numpy.arccos(numpy.clip(cos_zenith, -1, 1)))
+
+
+# UTC sunrise and sunset (datetime64[s]) around the solar noon of UTC days (day,) for points of any shape:
+# (day,) + points each (east of 90°E the sunrise falls on the UTC day before).
+# Polar night gives NaT for both, midnight sun solar noon -/+ 12 h
+def sunrise_sunset(utc_days, lats, lons):
+    utc_days = numpy.asarray(utc_days, dtype='datetime64[D]')
+    lats = numpy.asarray(lats, dtype=float)
+    lons = numpy.asarray(lons, dtype=float)
+    _, eqtime, decl = solar_terms(utc_days.astype('datetime64[s]') + 12*3600)
+    expand = (slice(None),) + (None,) * lats.ndim
+    lat_rad = numpy.radians(lats)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        cos_ha = (numpy.cos(numpy.radians(SUNRISE_ZENITH)) / (numpy.cos(lat_rad) * numpy.cos(decl)[expand])
+                  - numpy.tan(lat_rad) * numpy.tan(decl)[expand])
+    hour_angle = numpy.degrees(numpy.arccos(numpy.clip(cos_ha, -1, 1)))
+    noon_minutes = 720 - 4 * lons - eqtime[expand]
+    day_start = utc_days.astype('datetime64[s]')[expand]
+    sunrise = day_start + numpy.round((noon_minutes - 4 * hour_angle) * 60).astype('timedelta64[s]')
+    sunset = day_start + numpy.round((noon_minutes + 4 * hour_angle) * 60).astype('timedelta64[s]')
+    polar_night = cos_ha >= 1
+    sunrise[polar_night] = numpy.datetime64('NaT')
+    sunset[polar_night] = numpy.datetime64('NaT')
+    return sunrise, sunset
+
+
+# (time,) + points blocks of the daytime slots, computed DEFAULT_BLOCK_VALUES zenith angles at a time:
+# (time slice, bool block) pairs, the block is true when the zenith at the start or the end of the slot is below max_zenith
+def daytime_blocks(utc_times, lats, lons, slot_minutes=time_internal, max_zenith=DEFAULT_MAX_ZENITH,
+                   block_values=DEFAULT_BLOCK_VALUES):
+    utc_times = numpy.asarray(utc_times, dtype='datetime64[s]')
+    n_points = int(numpy.prod(numpy.broadcast_shapes(numpy.shape(lats), numpy.shape(lons))))
+    block_slots = max(1, block_values // max(n_points, 1))
+    for start in range(0, len(utc_times), block_slots):
+        block_times = utc_times[start:start + block_slots]
+        block_ends = block_times + numpy.timedelta64(slot_minutes * 60, 's')
+        block = solar_zenith(block_times, lats, lons) < max_zenith
+        block |= solar_zenith(block_ends, lats, lons) < max_zenith
+        yield slice(start, start + len(block_times)), block
+
+
+# 10-minute slots starting at UTC times (time,) in which the sun is up at some point for points of any shape:
+# (time,) + points bool, true when the zenith at the start or the end of the slot is below max_zenith
+def daytime_mask(utc_times, lats, lons, slot_minutes=time_internal, max_zenith=DEFAULT_MAX_ZENITH):
+    utc_times = numpy.asarray(utc_times, dtype='datetime64[s]')
+    points_shape = numpy.broadcast_shapes(numpy.shape(lats), numpy.shape(lons))
+    point_mask = numpy.zeros((len(utc_times),) + points_shape, dtype=bool)
+    for time_slice, block in daytime_blocks(utc_times, lats, lons, slot_minutes, max_zenith):
+        point_mask[time_slice] = block
+    return point_mask
+
+
+# (site, time) daytime slots of sites ([site, lat, lon, UTC+] rows of site_infos) with local time axes
+# (site, time) or (time,) as datetime64 (NaT, e.g. padding, is night)
+def site_daytime_mask(site_infos, local_times, slot_minutes=time_internal, max_zenith=DEFAULT_MAX_ZENITH):
+    local_times = numpy.asarray(local_times, dtype='datetime64[s]')
+    if local_times.ndim == 1:
+        local_times = numpy.broadcast_to(local_times, (len(site_infos), len(local_times)))
+    site_mask = numpy.zeros(local_times.shape, dtype=bool)
+    for site_idx, site_info in enumerate(site_infos):
+        site_times = local_times[site_idx]
+        valid = ~numpy.isnat(site_times)
+        utc_times = site_times[valid] - numpy.timedelta64(int(site_info[3] * 3600), 's')
+        site_mask[site_idx, valid] = daytime_mask(utc_times, site_info[1], site_info[2], slot_minutes, max_zenith)
+    return site_mask
+
+
+# UTC slots in which any of the points (sites or a grid) is in daytime: (time,) bool, for frame readers;
+# the (time,) + points mask is never built, only the blocks of daytime_blocks
+def any_daytime_mask(utc_times, lats, lons, slot_minutes=time_internal, max_zenith=DEFAULT_MAX_ZENITH):
+    slot_mask = numpy.zeros(len(utc_times), dtype=bool)
+    for time_slice, block in daytime_blocks(utc_times, lats, lons, slot_minutes, max_zenith):
+        slot_mask[time_slice] = block.reshape(len(block), -1).any(axis=1)
+    return slot_mask
+
+
+# UTC slots in which the sun is up at some pixel of a grid given by its pixel center lats (y,) and lons (x,),
+# planned on every plan_pixels-th row and column and the last ones: the same night steps for the input
+# processing and the PT-JPL run of a grid (00_save_area_inputdata, ptjpl_area_scheduler)
+def grid_daytime_mask(utc_times, lats, lons, slot_minutes=time_internal, max_zenith=DEFAULT_MAX_ZENITH,
+                      plan_pixels=DEFAULT_PLAN_PIXELS):
+    lats = numpy.asarray(lats, dtype=float)
+    lons = numpy.asarray(lons, dtype=float)
+    plan_lats = numpy.append(lats[::plan_pixels], lats[-1])
+    plan_lons = numpy.append(lons[::plan_pixels], lons[-1])
+    return any_daytime_mask(utc_times, plan_lats[:, None], plan_lons[None, :], slot_minutes, max_zenith)
+
+
+# (lats (y, 1), lons (1, x)) pixel centers of a coarse grid of an extent (l_lon, r_lon, b_lat, t_lat), to plan
+# the slots of a whole frame (e.g. AHI LST JP or AMATERASS JP) without its full-resolution grid
+def extent_points(extent, resolution=EXTENT_RESOLUTION):
+    l_lon, r_lon, b_lat, t_lat = extent
+    lats = numpy.arange(t_lat - resolution/2, b_lat, -resolution)
+    lons = numpy.arange(l_lon + resolution/2, r_lon, resolution)
+    return lats[:, None], lons[None, :]
+
+
+# slot_filter(utc_time) for one datetime at a time (e.g. ahilst_mirror.mirror_AHILST): any point in daytime
+def daytime_slot_filter(lats, lons, slot_minutes=time_internal, max_zenith=DEFAULT_MAX_ZENITH):
+    def keep(utc_time):
+        return bool(any_daytime_mask([numpy.datetime64(utc_time, 's')], lats, lons, slot_minutes, max_zenith)[0])
+    return keep
@@ -0,0 +1,161 @@
+import numpy as np
+
+TOPT_WINDOW = 14*24*6 # 2 weeks of 10-minute data
+TOPT_MIN_PERIODS = 24*6 # 1 day
+VPD_FLOOR = 0.5 # kPa
+DEFAULT_CHUNK_SIZE = 30*24*6 # samples per update in streaming_topt
+
+
+class StreamingTopt:
+    """
+        Optimum temperature of Topt_fun from the trailing window means of RN, TA, SAVI and VPD
+        (pandas rolling(window, min_periods).mean()), fed chunk by chunk.
+        Only the last window-1 samples are kept; the window sums of a chunk come from one cumulative sum
+        over those samples and the chunk, and the maximum of RN*TA*SAVI/max(VPD, 0.5) is tracked on the way.
+
+        skip_nan=False gives the Topt_fun result: like numpy argmax, a NaN window (e.g. one of the first
+        min_periods-1 samples) is taken as the maximum, so Topt is the TA mean of the first NaN window or,
+        as that is NaN, the highest TA window mean - 5.
+        skip_nan=True only looks at complete windows (nanargmax), with the same fallback when there are none.
+
+        :param n_sites: number of series updated side by side ((time, sites) chunks), None for one 1-D series
+        """
+    def __init__(self, n_sites=None, window=TOPT_WINDOW, min_periods=TOPT_MIN_PERIODS, skip_nan=False):
+        self.n_sites = n_sites
+        self.window = window
+        self.min_periods = min_periods
+        self.skip_nan = skip_nan
+        n = 1 if n_sites is None else n_sites
+        self.tail = np.empty((0, 4, n))
+        self.best_phen = np.full(n, -np.inf)
+        self.best_tmax = np.full(n, np.nan) # TA window mean at the maximum so far
+        self.max_tmax = np.full(n, np.nan) # highest TA window mean so far
+        self.nan_seen = np.zeros(n, dtype=bool)
+        self.nan_tmax = np.full(n, np.nan) # TA window mean of the first NaN window
+        self.n_samples = 0
+
+    # (time, 4, sites) trailing window means of a chunk, continuing the samples already seen
+    def window_means(self, chunk):
+        x = np.concatenate([self.tail, chunk])
+        valid = ~np.isnan(x)
+        sums = np.zeros((len(x) + 1,) + x.shape[1:])
+        np.cumsum(np.where(valid, x, 0.), axis=0, out=sums[1:])
+        counts = np.zeros((len(x) + 1,) + x.shape[1:], dtype=np.int64)
+        np.cumsum(valid, axis=0, out=counts[1:])
+
+        stop = np.arange(len(self.tail), len(x)) + 1
+        start = np.maximum(stop - self.window, 0)
+        n_obs = counts[stop] - counts[start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (sums[stop] - sums[start]) / n_obs
+        means[n_obs < max(self.min_periods, 1)] = np.nan
+
+        self.tail = x[max(len(x) - (self.window - 1), 0):]
+        return means
+
+    # Topt of the samples seen so far
+    def topt(self):
+        t_opt = np.where(self.nan_seen, self.nan_tmax, self.best_tmax)
+        t_opt = np.where(np.isnan(t_opt), self.max_tmax - 5, t_opt)
+        return float(t_opt[0]) if self.n_sites is None else t_opt
+
+    def update(self, rn, ta, savi, vpd, return_topt=False):
+        """
+            :param rn, ta, savi, vpd: next samples, (time,) or (time, sites)
+            :param return_topt: also return the Topt after every sample of the chunk (time-varying Topt)
+            """
+        chunk = np.stack([np.asarray(v, dtype=float) for v in (rn, ta, savi, vpd)], axis=1)
+        if chunk.ndim == 2:
+            chunk = chunk[:, :, None]
+        if chunk.shape[2] != len(self.best_phen):
+            raise ValueError('chunk has ' + str(chunk.shape[2]) + ' sites, expected ' + str(len(self.best_phen)))
+        n_time = len(chunk)
+        if n_time == 0:
+            return np.empty((0,) + self.best_phen.shape) if return_topt else None
+
+        means = self.window_means(chunk)
+        rn_m, tmax, savi_m, vpd_m = means[:, 0], means[:, 1], means[:, 2], means[:, 3]
+        topt_mask = ~np.isnan(rn_m) & ~np.isnan(tmax) & ~np.isnan(savi_m) & ~np.isnan(vpd_m)
+        with np.errstate(invalid='ignore'):
+            phen = rn_m*tmax*savi_m/np.maximum(vpd_m, VPD_FLOOR)
+        phen[~topt_mask] = -np.inf
+
+        # first strictly higher value = first occurrence of the maximum, as argmax
+        run_phen = np.maximum.accumulate(np.concatenate([self.best_phen[None], phen]), axis=0)
+        is_new = phen > run_phen[:-1]
+        time_idx = np.arange(n_time)[:, None]
+        new_idx = np.maximum.accumulate(np.where(is_new, time_idx, -1), axis=0)
+        site_idx = np.arange(phen.shape[1])[None, :]
+        run_tmax = np.where(new_idx >= 0, tmax[np.maximum(new_idx, 0), site_idx], self.best_tmax[None])
+        run_max_tmax = np.fmax.accumulate(np.concatenate([self.max_tmax[None], tmax]), axis=0)[1:]
+
+        if not self.skip_nan:
+            is_nan = ~topt_mask & ~self.nan_seen[None]
+            first_nan = np.argmax(is_nan, axis=0)
+            has_nan = is_nan.any(axis=0)
+            run_nan_seen = self.nan_seen[None] | np.logical_or.accumulate(is_nan, axis=0)
+            run_nan_tmax = np.where(self.nan_seen, self.nan_tmax, np.where(has_nan, tmax[first_nan, site_idx[0]], np.nan))
+            self.nan_tmax = run_nan_tmax
+            self.nan_seen = run_nan_seen[-1]
+
+        self.best_phen = run_phen[-1]
+        self.best_tmax = run_tmax[-1]
+        self.max_tmax = run_max_tmax[-1]
+        self.n_samples += n_time
+
+        if not return_topt:
+            return None
+        t_opt = run_tmax
+        if not self.skip_nan:
+            t_opt = np.where(run_nan_seen, run_nan_tmax[None], t_opt)
+        t_opt = np.where(np.isnan(t_opt), run_max_tmax - 5, t_opt)
+        return t_opt[:, 0] if self.n_sites is None else t_opt
+
+
+# trailing window means along the last axis (pandas rolling(window, min_periods).mean() of every series),
+# NaN samples left out; (site, time) arrays padded with NaN at the end keep the means of their samples
+def trailing_means(values, window, min_periods=1):
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    sums = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(np.where(valid, values, 0.), axis=-1, out=sums[..., 1:])
+    counts = np.zeros(sums.shape, dtype=np.int64)
+    np.cumsum(valid, axis=-1, out=counts[..., 1:])
+
+    stop = np.arange(values.shape[-1]) + 1
+    start = np.maximum(stop - window, 0)
+    n_obs = counts[..., stop] - counts[..., start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums[..., stop] - sums[..., start]) / n_obs
+    means[n_obs < max(min_periods, 1)] = np.nan
+    return means
+
+
+# Topt of whole series (1-D, or (time, sites) for several sites), streamed in chunks of chunk_size samples
+# instead of building the four rolling means; with return_topt_series also the Topt after every sample
+def streaming_topt(rn, ta, savi, vpd, window=TOPT_WINDOW, min_periods=TOPT_MIN_PERIODS, skip_nan=False,
+                   chunk_size=DEFAULT_CHUNK_SIZE, return_topt_series=False):
+    rn, ta, savi, vpd = [np.asarray(v) for v in (rn, ta, savi, vpd)]
+    estimator = StreamingTopt(None if rn.ndim == 1 else rn.shape[1], window, min_periods, skip_nan)
+    topt_series = []
+    for i in range(0, len(rn), chunk_size):
+        chunk_topt = estimator.update(rn[i:i+chunk_size], ta[i:i+chunk_size], savi[i:i+chunk_size],
+                                      vpd[i:i+chunk_size], return_topt_series)
+        if return_topt_series:
+            topt_series.append(chunk_topt)
+    if return_topt_series:
+        return estimator.topt(), np.concatenate(topt_series)
+    return estimator.topt()
+
+
+# Topt of every site of (site, time) arrays padded with NaN at the end, as (site, 1) so it broadcasts over time;
+# the padding is left out by taking the Topt after the last sample of each site. 1-D series give a float.
+def site_topt(rn, ta, savi, vpd, lengths=None, window=TOPT_WINDOW, min_periods=TOPT_MIN_PERIODS, skip_nan=False,
+              chunk_size=DEFAULT_CHUNK_SIZE):
+    if np.ndim(rn) == 1:
+        return streaming_topt(rn, ta, savi, vpd, window, min_periods, skip_nan, chunk_size)
+    n_sites, n_time = np.shape(rn)
+    lengths = np.full(n_sites, n_time) if lengths is None else np.asarray(lengths)
+    _, topt_series = streaming_topt(np.transpose(rn), np.transpose(ta), np.transpose(savi), np.transpose(vpd),
+                                    window, min_periods, skip_nan, chunk_size, return_topt_series=True)
+    return topt_series[lengths - 1, np.arange(n_sites)][:, None]